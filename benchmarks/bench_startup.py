@@ -0,0 +1,74 @@
+#! /usr/bin/env python
+#
+# Measure how long a fresh process takes to import little_big_query,
+# construct a LittleBigQuery and build its service on first use, with
+# a cold and a warm discovery document cache.
+#
+# Usage: python benchmarks/bench_startup.py [runs]
+#
+# Each measurement runs in its own interpreter so nothing is already
+# imported.  The cold run needs network access unless the installed API
+# client bundles the discovery document.
+#
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+class StubCredentials(object):
+    """Lets the service be built without application default credentials."""
+    def authorize(self, http):
+        return http
+
+def child(cache_dir):
+    start = time.time()
+    sys.path.insert(0, ROOT)
+    from little_big_query import LittleBigQuery
+    imported = time.time()
+    pandas_loaded = "pandas" in sys.modules
+
+    bq = LittleBigQuery("bench-project", discovery_cache=cache_dir)
+    constructed = time.time()
+
+    bq.credentials = StubCredentials()
+    try:
+        bq.bigquery_service.tables()
+        first_call = time.time() - constructed
+    except Exception:
+        first_call = None
+    print(json.dumps({"import": imported - start,
+        "construct": constructed - imported, "first_call": first_call,
+        "pandas_on_import": pandas_loaded}))
+
+def run(cache_dir):
+    out = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+        "--child", cache_dir])
+    return json.loads(out.decode("utf-8").strip().splitlines()[-1])
+
+def seconds(value):
+    return "%10.3f" % value if value is not None else "%10s" % "failed"
+
+def main(runs=3):
+    print("%6s %10s %10s %10s %10s" % ("cache", "import s", "init s",
+        "first s", "pandas"))
+    for _ in range(runs):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            for label in ("cold", "warm"):
+                r = run(cache_dir)
+                print("%6s %s %s %s %10s" % (label, seconds(r["import"]),
+                    seconds(r["construct"]), seconds(r["first_call"]),
+                    r["pandas_on_import"]))
+        finally:
+            shutil.rmtree(cache_dir)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        child(sys.argv[2])
+    else:
+        main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,133 @@
+#! /usr/bin/env python
+#
+# Measure resumable upload throughput of createTableFromLocalCSV's
+# upload path against a local stand-in for the BigQuery upload endpoint.
+#
+# Usage: python benchmarks/bench_upload.py [megabytes] [fail_every]
+#
+# fail_every makes the stand-in answer every Nth chunk with a 503, to
+# exercise resuming from the last confirmed offset.
+#
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from googleapiclient.http import HttpRequest, MediaFileUpload
+from googleapiclient.model import JsonModel
+from little_big_query.little_big_query import LittleBigQuery, Backoff
+from little_big_query.transport import new_http
+
+class UploadHandler(BaseHTTPRequestHandler):
+    """Speaks just enough of the resumable upload protocol: POST starts a
+    session, PUT appends a chunk and answers 308 until the last one."""
+
+    received = 0
+    puts = 0
+    fail_every = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, headers=None, body=b""):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        UploadHandler.received = 0
+        self._reply(200, {"Location": "http://%s:%d/session" % self.server.server_address})
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        first, last, total = re.match(r"bytes (\*|\d+)-?(\d*)/(\*|\d+)",
+            self.headers["Content-Range"]).groups()
+        UploadHandler.puts += 1
+        if first != "*":
+            if self.fail_every and UploadHandler.puts % self.fail_every == 0:
+                self._reply(503)
+                return
+            if int(first) == UploadHandler.received:
+                UploadHandler.received += len(body)
+        if total != "*" and UploadHandler.received == int(total):
+            job = {"jobReference": {"projectId": "p", "jobId": "upload"},
+                "status": {"state": "RUNNING"}}
+            self._reply(200, {"Content-Type": "application/json"},
+                json.dumps(job).encode("utf-8"))
+        elif UploadHandler.received:
+            self._reply(308, {"Range": "bytes=0-%d" % (UploadHandler.received - 1)})
+        else:
+            self._reply(308)
+
+def make_csv(megabytes):
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    rnd = random.Random(0)
+    with os.fdopen(fd, "w") as f:
+        written, i = 0, 0
+        while written < megabytes * 1024 * 1024:
+            line = "%d,user%d@example.com,%.2f,%d\n" % (i, i, rnd.random() * 1000,
+                1400000000 + i)
+            f.write(line)
+            written += len(line)
+            i += 1
+    return path
+
+def upload(bq, url, path, chunksize, compress):
+    start = time.time()
+    upload_path = bq._gzip_file(path) if compress else path
+    try:
+        media = MediaFileUpload(upload_path, mimetype="application/octet-stream",
+            chunksize=chunksize, resumable=True)
+        request = HttpRequest(None, JsonModel().response, url,
+            method="POST", body=json.dumps({"configuration": {}}),
+            headers={"content-type": "application/json"}, resumable=media)
+        job = bq._resumable_upload(request, http=new_http())
+        elapsed = time.time() - start
+        return os.path.getsize(upload_path), elapsed, job
+    finally:
+        if upload_path != path:
+            os.remove(upload_path)
+
+def main(megabytes=64, fail_every=0):
+    UploadHandler.fail_every = fail_every
+    server = HTTPServer(("127.0.0.1", 0), UploadHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = "http://127.0.0.1:%d/upload" % server.server_address[1]
+
+    bq = LittleBigQuery.__new__(LittleBigQuery)
+    bq.backoff = Backoff(initial=0.01)
+    path = make_csv(megabytes)
+    raw_size = os.path.getsize(path)
+    print("%10s %8s %12s %10s %12s" % ("chunk", "gzip", "sent MB", "seconds",
+        "source MB/s"))
+    try:
+        for chunksize in (1024 * 1024, 8 * 1024 * 1024, 32 * 1024 * 1024):
+            for compress in (False, True):
+                sent, elapsed, job = upload(bq, url, path, chunksize, compress)
+                assert job["jobReference"]["jobId"] == "upload"
+                print("%9dM %8s %12.1f %10.2f %12.1f" % (chunksize // (1024 * 1024),
+                    compress, sent / 1048576.0, elapsed,
+                    raw_size / 1048576.0 / elapsed))
+    finally:
+        os.remove(path)
+        server.shutdown()
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,723 @@
+#! /usr/bin/env python
+#
+# A local stand-in for the BigQuery v2 REST API, serving synthetic data,
+# so LittleBigQuery can be benchmarked without network access or a GCP
+# project.
+#
+# Usage: python benchmarks/fake_bigquery.py [--port N] [--latency S]
+#     [--job-seconds S] [--rows N] [--page-rows N] [--days N]
+#     [--export-root DIR] [--shard-rows N] [--rate-limit N]
+#
+# Implements jobs (insert, get, getQueryResults, resumable uploads),
+# tables, tabledata (list, insertAll), datasets, projects and batch
+# requests.  Query results are made up from the query text:
+#   - "LIMIT n" returns n rows, otherwise --rows rows (or the row count
+#     of the table the query reads)
+#   - "COUNT(*)" returns a single count
+#   - the YEAR/MONTH/DAY "GROUP BY 1, 2, 3" query of partitionTable
+#     returns --days days
+#   - [dataset.table$__PARTITIONS_SUMMARY__] lists that table's partitions
+# Every request waits --latency seconds; jobs run for --job-seconds.
+# With --rate-limit, requests beyond that many per second are refused
+# with 403 rateLimitExceeded, as BigQuery refuses them.
+# Extract jobs write made-up shards of the table to --export-root, which
+# LocalStore(--export-root) reads them back from.
+#
+# connect() returns a LittleBigQuery wired to a running stand-in.  It
+# needs the discovery document bundled with newer API clients or already
+# in the discovery cache; nothing else goes over the network.
+#
+import argparse
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# the columns of made-up query results, as in bench_decode
+QUERY_SCHEMA = [
+    {"name": "id", "type": "INTEGER"},
+    {"name": "email", "type": "STRING"},
+    {"name": "amount", "type": "FLOAT"},
+    {"name": "active", "type": "BOOLEAN"},
+    {"name": "event_time", "type": "TIMESTAMP"}
+]
+
+# where query results without a destinationTable are kept
+ANONYMOUS_DATASET = "_anonymous"
+
+_TABLE_REF = re.compile(r"\[?`?(?:([\w-]+)[:.])?([\w-]+)\.([\w$-]+)`?\]?")
+
+class _Conflict(Exception):
+    """A job with the inserted jobId exists already."""
+
+def _value(fieldType, i):
+    """The made-up value of row i of a column, as BigQuery encodes it."""
+    if fieldType in ("INTEGER", "INT64"):
+        return str(i)
+    if fieldType in ("FLOAT", "FLOAT64", "NUMERIC"):
+        return repr((i * 7919 % 100000) / 100.0)
+    if fieldType in ("BOOLEAN", "BOOL"):
+        return "true" if i % 2 else "false"
+    if fieldType == "TIMESTAMP":
+        return "%.6fE9" % (1.45 + (i % 86400) / 1e9 * 1000)
+    if fieldType == "DATE":
+        return (date(2016, 1, 1) + timedelta(days=i % 365)).isoformat()
+    return "user%d@example.com" % i
+
+def _export_value(fieldType, i):
+    """Row i of a column as an extract job writes it: INTEGERs as
+    strings, other numbers and booleans as such, TIMESTAMPs in UTC."""
+    v = _value(fieldType, i)
+    if fieldType in ("FLOAT", "FLOAT64"):
+        return float(v)
+    if fieldType in ("BOOLEAN", "BOOL"):
+        return v == "true"
+    if fieldType == "TIMESTAMP":
+        return datetime.utcfromtimestamp(float(v)).strftime("%Y-%m-%d %H:%M:%S.%f UTC")
+    return v
+
+def _write_avro(path, fields, records):
+    try:
+        import fastavro
+    except ImportError:
+        return {"reason": "invalid", "message": "AVRO exports need fastavro"}
+    types = {"INTEGER": "long", "FLOAT": "double", "BOOLEAN": "boolean",
+        "TIMESTAMP": {"type": "long", "logicalType": "timestamp-micros"}}
+    schema = {"type": "record", "name": "Root", "fields": [{"name": f["name"],
+        "type": ["null", types.get(f["type"], "string")]} for f in fields]}
+    def avro(record):
+        for f in fields:
+            v = record[f["name"]]
+            if f["type"] == "INTEGER":
+                record[f["name"]] = int(v)
+            elif f["type"] == "TIMESTAMP":
+                record[f["name"]] = datetime.strptime(v, "%Y-%m-%d %H:%M:%S.%f UTC")
+        return record
+    with open(path, "wb") as f:
+        fastavro.writer(f, fastavro.parse_schema(schema), (avro(r) for r in records),
+            codec="deflate")
+    return None
+
+class FakeBigQuery(object):
+    """
+    The state of the fake service: datasets, tables and jobs.  handle()
+    answers one request; Handler puts it on HTTP.
+
+    Attributes:
+        latency: seconds every request waits before it is answered
+        job_seconds: how long every job stays RUNNING
+        rows: the row count of query results that don't say otherwise
+        page_rows: the most rows returned per results page
+        days: the distinct days partitionTable's day query finds
+        export_root: where extract jobs write gs://bucket/name, as
+            export_root/bucket/name (see little_big_query.export.LocalStore);
+            None fails extract jobs
+        shard_rows: the rows per extract shard
+        rate_limit: the most requests answered per second (None: all);
+            the rest get a 403 rateLimitExceeded
+        throttled: the requests refused so far
+    """
+
+    def __init__(self, projectId="bench", datasets=("bench",), latency=0.0,
+        job_seconds=0.0, rows=10000, page_rows=10000, days=30, export_root=None,
+        shard_rows=50000, rate_limit=None):
+        self.projectId = projectId
+        self.latency = latency
+        self.job_seconds = job_seconds
+        self.rows = rows
+        self.page_rows = page_rows
+        self.days = days
+        self.export_root = export_root
+        self.shard_rows = shard_rows
+        self.datasets = dict((d, {}) for d in datasets)
+        self.datasets[ANONYMOUS_DATASET] = {}
+        self.jobs = {}
+        self.uploads = {}
+        self.requests = 0
+        self.rate_limit = rate_limit
+        self.throttled = 0
+        self._second = (0, 0)
+        self._encoded = {}
+        self._lock = threading.RLock()
+
+    ### plumbing
+    def handle(self, method, path, params, body):
+        """Returns (status, headers, body) for one request."""
+        with self._lock:
+            self.requests += 1
+            if self.rate_limit is not None:
+                second, count = self._second
+                now = int(time.time())
+                count = count + 1 if now == second else 1
+                self._second = (now, count)
+                if count > self.rate_limit:
+                    self.throttled += 1
+                    return self._error(403, "rateLimitExceeded",
+                        "Exceeded rate limits: too many api requests per user per method")
+        route = path.split("/bigquery/v2/", 1)[-1].strip("/").split("/")
+        try:
+            if path.startswith("/upload/session/"):
+                return self._upload_chunk(path.rsplit("/", 1)[1], params, body)
+            if path.startswith("/upload/"):
+                return self._start_upload(route, params, body)
+            return self._route(method, route, params, body)
+        except KeyError as e:
+            return self._error(404, "notFound", "Not found: %s" % e.args[0])
+        except _Conflict as e:
+            return self._error(409, "duplicate", "Already Exists: Job %s:%s"
+                % (self.projectId, e.args[0]))
+
+    def _route(self, method, route, params, body):
+        data = json.loads(body.decode("utf-8")) if body else None
+        if route == ["projects"]:
+            return self._ok({"projects": [{"id": self.projectId,
+                "friendlyName": self.projectId,
+                "projectReference": {"projectId": self.projectId}}]})
+        if len(route) < 3:
+            return self._error(404, "notFound", "Unknown path")
+        collection = route[2]
+        if collection == "jobs" and len(route) == 3 and method == "POST":
+            return self._ok(self._insert_job(data))
+        if collection == "jobs" and len(route) == 4:
+            return self._ok(self._job(route[3]))
+        if collection == "queries":
+            return self._query_results(route[3], params)
+        if collection == "datasets":
+            return self._datasets(method, route[3:], params, data)
+        return self._error(404, "notFound", "Unknown path")
+
+    def _ok(self, resource, status=200):
+        content = resource if isinstance(resource, bytes) else \
+            json.dumps(resource).encode("utf-8")
+        return status, {"Content-Type": "application/json"}, content
+
+    def _error(self, status, reason, message):
+        return self._ok({"error": {"code": status, "message": message,
+            "errors": [{"reason": reason, "message": message}]}}, status)
+
+    ### datasets and tables
+    def _datasets(self, method, route, params, data):
+        if not route:
+            if method == "POST":
+                datasetId = data["datasetReference"]["datasetId"]
+                if datasetId in self.datasets:
+                    return self._error(409, "duplicate", "Already Exists: %s" % datasetId)
+                self.datasets[datasetId] = {}
+                return self._ok(data)
+            return self._ok({"datasets": [{"datasetReference": {
+                "projectId": self.projectId, "datasetId": d}}
+                for d in sorted(self.datasets) if not d.startswith("_")]})
+        datasetId = route[0]
+        if datasetId not in self.datasets:
+            raise KeyError("Dataset %s:%s" % (self.projectId, datasetId))
+        tables = self.datasets[datasetId]
+        if len(route) == 1:
+            if method == "DELETE":
+                if tables and params.get("deleteContents") != "true":
+                    return self._error(400, "resourceInUse",
+                        "Dataset %s is still in use" % datasetId)
+                del self.datasets[datasetId]
+                return 204, {}, b""
+            return self._ok({"datasetReference": {"projectId": self.projectId,
+                "datasetId": datasetId}})
+        if len(route) == 2:
+            if method == "POST":
+                tableId = data["tableReference"]["tableId"]
+                if tableId in tables:
+                    return self._error(409, "duplicate", "Already Exists: Table %s" % tableId)
+                tables[tableId] = {"schema": data.get("schema", {}).get("fields", []),
+                    "rows": 0, "partitions": set(), "insertIds": set(),
+                    "timePartitioning": data.get("timePartitioning"),
+                    "view": data.get("view")}
+                return self._ok(self._table_resource(datasetId, tableId))
+            return self._ok(self._list(
+                [self._table_resource(datasetId, t, brief=True) for t in sorted(tables)],
+                "tables", params))
+        tableId, _, partition = route[2].partition("$")
+        if tableId not in tables:
+            raise KeyError("Table %s:%s.%s" % (self.projectId, datasetId, tableId))
+        if len(route) == 3:
+            if method == "DELETE":
+                if partition:
+                    tables[tableId]["partitions"].discard(partition)
+                else:
+                    del tables[tableId]
+                return 204, {}, b""
+            return self._ok(self._table_resource(datasetId, tableId))
+        if route[3] == "insertAll":
+            return self._ok(self._insert_all(tables[tableId], data))
+        if route[3] == "data":
+            return self._table_data(tables[tableId], params, partition)
+        return self._error(404, "notFound", "Unknown path")
+
+    def _table_resource(self, datasetId, tableId, brief=False):
+        table = self.datasets[datasetId][tableId]
+        resource = {"tableReference": {"projectId": self.projectId,
+            "datasetId": datasetId, "tableId": tableId},
+            "type": "VIEW" if table["view"] else "TABLE"}
+        if table["timePartitioning"]:
+            resource["timePartitioning"] = table["timePartitioning"]
+        if not brief:
+            resource["schema"] = {"fields": table["schema"]}
+            resource["numRows"] = str(table["rows"])
+        return resource
+
+    def _list(self, items, field, params):
+        start = int(params.get("pageToken", 0))
+        size = int(params.get("maxResults", 50))
+        page = {field: items[start:start + size], "totalItems": len(items)}
+        if start + size < len(items):
+            page["nextPageToken"] = str(start + size)
+        return page
+
+    def _insert_all(self, table, data):
+        with self._lock:
+            for row in data.get("rows", []):
+                insertId = row.get("insertId")
+                if insertId is None or insertId not in table["insertIds"]:
+                    table["insertIds"].add(insertId)
+                    table["rows"] += 1
+        return {"kind": "bigquery#tableDataInsertAllResponse"}
+
+    def _table_data(self, table, params, partition=""):
+        fields = table["schema"]
+        selected = params.get("selectedFields")
+        if selected:
+            names = selected.split(",")
+            fields = [f for f in fields if f["name"] in names]
+        total = table["rows"]
+        if partition:
+            # the rows are spread evenly over the partitions
+            if partition not in table["partitions"]:
+                total = 0
+            else:
+                total //= len(table["partitions"])
+        start = int(params.get("pageToken", params.get("startIndex", 0)))
+        count = min(int(params.get("maxResults", self.page_rows)), self.page_rows,
+            max(total - start, 0))
+        page = {"kind": "bigquery#tableDataList", "totalRows": str(total)}
+        if start + count < total:
+            page["pageToken"] = str(start + count)
+        return self._ok(self._with_rows(page, fields, start, count))
+
+    ### jobs
+    def _insert_job(self, data):
+        reference = data.get("jobReference", {})
+        jobId = reference.get("jobId") or reference.get("job_id") or uuid.uuid4().hex
+        configuration = data.get("configuration", {})
+        with self._lock:
+            if jobId in self.jobs:
+                raise _Conflict(jobId)
+        job = {"jobReference": {"projectId": self.projectId, "jobId": jobId},
+            "configuration": configuration, "status": {"state": "RUNNING"},
+            "statistics": {"creationTime": str(int(time.time() * 1000))}}
+        result = None
+        error = None
+        if "query" in configuration:
+            result = self._plan_query(configuration["query"]["query"])
+            processed = result["rows"] * 50
+            job["statistics"]["totalBytesProcessed"] = str(processed)
+            job["statistics"]["query"] = {"totalBytesProcessed": str(processed),
+                "cacheHit": False, "referencedTables": result["tables"],
+                "schema": {"fields": result["schema"]},
+                "queryPlan": self._query_plan(result["rows"])}
+            if configuration.get("dryRun"):
+                job["status"] = {"state": "DONE"}
+                return job
+            limit = configuration["query"].get("maximumBytesBilled")
+            if limit is not None and processed > int(limit):
+                error = {"reason": "bytesBilledLimitExceeded",
+                    "message": "Query exceeded limit for bytes billed: %s." % limit}
+            elif "destinationTable" in configuration["query"]:
+                error = self._write(configuration["query"], result["schema"],
+                    result["rows"])
+            else:
+                # like BigQuery, keep the result in an anonymous table
+                configuration["query"]["destinationTable"] = {
+                    "projectId": self.projectId, "datasetId": ANONYMOUS_DATASET,
+                    "tableId": "anon" + jobId.replace("-", "_")}
+                error = self._write(configuration["query"], result["schema"],
+                    result["rows"])
+        elif "load" in configuration:
+            load = configuration["load"]
+            rows = load.pop("_uploadedRows", self.rows)
+            error = self._write(load, load.get("schema", {}).get("fields"), rows,
+                createDisposition=load.get("createDisposition", "CREATE_IF_NEEDED"),
+                default="WRITE_APPEND")
+        elif "copy" in configuration:
+            copy = configuration["copy"]
+            sources = copy.get("sourceTables") or [copy["sourceTable"]]
+            source = self._table(sources[0])
+            error = self._write(copy, source["schema"],
+                sum(self._table(s)["rows"] for s in sources))
+        elif "extract" in configuration:
+            error = self._extract(configuration["extract"], job["statistics"])
+        with self._lock:
+            self.jobs[jobId] = {"resource": job, "result": result, "error": error,
+                "done_at": time.time() + self.job_seconds}
+        return self._job(jobId)
+
+    def _table(self, reference):
+        return self.datasets[reference["datasetId"]][reference["tableId"].split("$")[0]]
+
+    def _write(self, config, schema, rows, createDisposition="CREATE_IF_NEEDED",
+        default="WRITE_EMPTY"):
+        """Applies a job's write to its destinationTable; returns an
+        errorResult or None."""
+        reference = config["destinationTable"]
+        tableId, _, partition = reference["tableId"].partition("$")
+        tables = self.datasets.get(reference["datasetId"])
+        if tables is None:
+            return {"reason": "notFound", "message": "Not found: Dataset %s"
+                % reference["datasetId"]}
+        with self._lock:
+            table = tables.get(tableId)
+            if table is None:
+                if config.get("createDisposition", createDisposition) == "CREATE_NEVER":
+                    return {"reason": "notFound", "message": "Not found: Table %s" % tableId}
+                table = tables[tableId] = {"schema": schema or [], "rows": 0,
+                    "partitions": set(), "insertIds": set(),
+                    "timePartitioning": config.get("timePartitioning"), "view": None}
+            disposition = config.get("writeDisposition", default)
+            if disposition == "WRITE_EMPTY" and table["rows"] and not partition:
+                return {"reason": "duplicate", "message": "Already Exists: Table %s" % tableId}
+            if disposition == "WRITE_TRUNCATE" and not partition:
+                table["rows"] = 0
+            if schema and not table["schema"]:
+                table["schema"] = schema
+            table["rows"] += rows
+            if partition:
+                table["partitions"].add(partition)
+        return None
+
+    def _job(self, jobId):
+        with self._lock:
+            entry = self.jobs[jobId]
+        job = entry["resource"]
+        if job["status"]["state"] != "DONE" and time.time() >= entry["done_at"]:
+            job["status"] = {"state": "DONE"}
+            if entry["error"]:
+                job["status"]["errorResult"] = entry["error"]
+                job["status"]["errors"] = [entry["error"]]
+            job["statistics"]["endTime"] = str(int(time.time() * 1000))
+        return job
+
+    def _query_results(self, jobId, params):
+        with self._lock:
+            entry = self.jobs[jobId]
+        wait = min(float(params.get("timeoutMs", 10000)) / 1000.0,
+            entry["done_at"] - time.time())
+        if wait > 0:
+            time.sleep(wait)
+        job = self._job(jobId)
+        response = {"kind": "bigquery#getQueryResultsResponse",
+            "jobReference": job["jobReference"]}
+        if job["status"]["state"] != "DONE":
+            response["jobComplete"] = False
+            return self._ok(response)
+        if "errorResult" in job["status"]:
+            return self._error(400, job["status"]["errorResult"]["reason"],
+                job["status"]["errorResult"]["message"])
+        result = entry["result"]
+        response["jobComplete"] = True
+        response["schema"] = {"fields": result["schema"]}
+        response["totalRows"] = str(result["rows"])
+        start = int(params.get("pageToken", params.get("startIndex", 0)))
+        count = min(int(params.get("maxResults", self.page_rows)), self.page_rows,
+            max(result["rows"] - start, 0))
+        if start + count < result["rows"]:
+            response["pageToken"] = str(start + count)
+        if result["values"] is not None:
+            response["rows"] = [{"f": [{"v": v} for v in row]}
+                for row in result["values"][start:start + count]]
+            return self._ok(response)
+        return self._ok(self._with_rows(response, result["schema"], start, count))
+
+    def _plan_query(self, q):
+        """Makes up the schema and rows a query returns."""
+        tables = []
+        for project, datasetId, tableId in _TABLE_REF.findall(q):
+            if datasetId in self.datasets:
+                tables.append({"projectId": project or self.projectId,
+                    "datasetId": datasetId, "tableId": tableId.split("$")[0]})
+        summaries = re.findall(r"([\w-]+)\.([\w-]+)\$__PARTITIONS_SUMMARY__", q)
+        if summaries:
+            values = []
+            for datasetId, tableId in summaries:
+                table = self.datasets[datasetId][tableId]
+                values.extend([tableId, p] for p in sorted(table["partitions"]))
+            if "table_id" in q:
+                schema = [{"name": "table_id", "type": "STRING"},
+                    {"name": "partition_id", "type": "STRING"}]
+            else:
+                schema = [{"name": "partition_id", "type": "STRING"}]
+                values = [v[1:] for v in values]
+            return {"schema": schema, "rows": len(values), "values": values,
+                "tables": tables}
+        if re.search(r"GROUP BY 1, 2, 3", q) and " as d" in q:
+            days = [date(2016, 1, 1) + timedelta(days=i) for i in range(self.days)]
+            return {"schema": [{"name": n, "type": "INTEGER"} for n in "ymd"],
+                "rows": len(days), "tables": tables, "values":
+                [[str(d.year), str(d.month), str(d.day)] for d in days]}
+
+        schema, rows = QUERY_SCHEMA, self.rows
+        for t in tables:
+            table = self.datasets[t["datasetId"]].get(t["tableId"])
+            if table is not None and table["schema"]:
+                schema, rows = table["schema"], table["rows"]
+                break
+        if re.search(r"count\(\*\)", q, re.I):
+            return {"schema": [{"name": "f0_", "type": "INTEGER"}], "rows": 1,
+                "values": [[str(rows)]], "tables": tables}
+        limit = re.search(r"LIMIT\s+(\d+)", q, re.I)
+        if limit:
+            rows = int(limit.group(1))
+        return {"schema": schema, "rows": rows, "values": None, "tables": tables}
+
+    def _query_plan(self, rows):
+        return [
+            {"name": "S00: Input", "id": "0", "status": "COMPLETE",
+                "startMs": "1000", "endMs": "1400", "slotMs": str(rows // 100 + 1),
+                "recordsRead": str(rows), "recordsWritten": str(rows),
+                "waitRatioAvg": 0.1, "waitRatioMax": 0.2, "readRatioAvg": 0.5,
+                "readRatioMax": 1.0, "computeRatioAvg": 0.3, "computeRatioMax": 0.6,
+                "writeRatioAvg": 0.1, "writeRatioMax": 0.2},
+            {"name": "S01: Output", "id": "1", "status": "COMPLETE",
+                "startMs": "1400", "endMs": "1500", "slotMs": "10",
+                "recordsRead": str(rows), "recordsWritten": str(rows),
+                "waitRatioAvg": 0.0, "waitRatioMax": 0.1, "readRatioAvg": 0.2,
+                "readRatioMax": 0.4, "computeRatioAvg": 0.1, "computeRatioMax": 0.2,
+                "writeRatioAvg": 0.5, "writeRatioMax": 1.0}
+        ]
+
+    def _with_rows(self, response, fields, start, count):
+        """Encodes response with rows [start, start + count) of made-up
+        data spliced in; encoded rows are kept for the next page."""
+        key = tuple(f["type"] for f in fields)
+        with self._lock:
+            encoded = self._encoded.setdefault(key, [])
+            while len(encoded) < start + count:
+                i = len(encoded)
+                encoded.append(json.dumps({"f": [{"v": _value(t, i)} for t in key]}))
+            page = encoded[start:start + count]
+        if not page:
+            return json.dumps(response).encode("utf-8")
+        body = json.dumps(response)
+        return (body[:-1] + ', "rows": [' + ",".join(page) + "]}").encode("utf-8")
+
+    ### extract jobs
+    def _extract(self, config, statistics):
+        """Writes a table's made-up rows to shards under export_root;
+        returns an errorResult or None."""
+        table = self._table(config["sourceTable"])
+        if self.export_root is None:
+            return {"reason": "invalid", "message": "The stand-in has no export_root"}
+        format = config.get("destinationFormat", "CSV")
+        if format not in ("NEWLINE_DELIMITED_JSON", "AVRO"):
+            return {"reason": "invalid", "message": "Unsupported format: %s" % format}
+        uri = config["destinationUris"][0]
+        bucket, _, name = uri[len("gs://"):].partition("/")
+        fields = table["schema"]
+        # without a wildcard everything goes to one file
+        per_shard = self.shard_rows if "*" in name else max(table["rows"], 1)
+        shards = max(1, -(-table["rows"] // per_shard))
+        for n in range(shards):
+            path = os.path.join(self.export_root, bucket,
+                *name.replace("*", "%012d" % n).split("/"))
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            rows = range(n * per_shard, min((n + 1) * per_shard, table["rows"]))
+            records = (dict((f["name"], _export_value(f["type"], i)) for f in fields)
+                for i in rows)
+            if format == "AVRO":
+                error = _write_avro(path, fields, records)
+                if error:
+                    return error
+                continue
+            opener = gzip.open if config.get("compression") == "GZIP" else open
+            with opener(path, "wb") as f:
+                for record in records:
+                    f.write((json.dumps(record) + "\n").encode("utf-8"))
+        statistics["extract"] = {"destinationUriFileCounts": [str(shards)]}
+        return None
+
+    ### resumable uploads
+    def _start_upload(self, route, params, body):
+        session = uuid.uuid4().hex
+        with self._lock:
+            self.uploads[session] = {"job": json.loads(body.decode("utf-8")),
+                "data": io.BytesIO()}
+        return 200, {"Location": "%s/upload/session/%s" % (self.url, session)}, b""
+
+    def _upload_chunk(self, session, params, body):
+        upload = self.uploads[session]
+        first, last, total = re.match(r"bytes (\*|\d+)-?(\d*)/(\*|\d+)",
+            params["content-range"]).groups()
+        data = upload["data"]
+        if first != "*" and int(first) == data.tell():
+            data.write(body)
+        if total != "*" and data.tell() == int(total):
+            content = data.getvalue()
+            if content[:2] == b"\x1f\x8b":
+                content = gzip.GzipFile(fileobj=io.BytesIO(content)).read()
+            job = upload["job"]
+            load = job.setdefault("configuration", {}).setdefault("load", {})
+            if load.get("sourceFormat") == "PARQUET":
+                load["_uploadedRows"] = self.rows
+            else:
+                load["_uploadedRows"] = content.count(b"\n")
+            with self._lock:
+                del self.uploads[session]
+            return self._ok(self._insert_job(job))
+        if data.tell():
+            return 308, {"Range": "bytes=0-%d" % (data.tell() - 1)}, b""
+        return 308, {}, b""
+
+    ### batch requests
+    def handle_batch(self, content_type, body):
+        boundary = re.search(r'boundary="?([^";]+)"?', content_type).group(1)
+        parts = body.decode("utf-8").split("--" + boundary)
+        out_boundary = "batch_" + uuid.uuid4().hex
+        out = []
+        for part in parts[1:]:
+            if part.strip() in ("", "--"):
+                continue
+            headers, inner = re.split(r"\r?\n\r?\n", part.lstrip("\r\n"), 1)
+            contentId = re.search(r"Content-ID:\s*<([^>]*)>", headers, re.I).group(1)
+            head_body = re.split(r"\r?\n\r?\n", inner, 1)
+            head, inner_body = head_body[0], head_body[1] if len(head_body) > 1 else ""
+            method, target = head.split()[:2]
+            url = urlparse(target)
+            params = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+            status, headers_out, content = self.handle(method, url.path, params,
+                inner_body.strip().encode("utf-8"))
+            out.append("--%s\r\nContent-Type: application/http\r\n"
+                "Content-ID: <response-%s>\r\n\r\nHTTP/1.1 %d %s\r\n"
+                "Content-Type: application/json\r\nContent-Length: %d\r\n\r\n%s\r\n"
+                % (out_boundary, contentId, status, "OK" if status < 300 else "Error",
+                    len(content), content.decode("utf-8")))
+        out.append("--%s--\r\n" % out_boundary)
+        return 200, {"Content-Type": 'multipart/mixed; boundary="%s"' % out_boundary}, \
+            "".join(out).encode("utf-8")
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # send headers and body in one segment instead of waiting out a
+    # delayed ACK between them
+    disable_nagle_algorithm = True
+    wbufsize = -1
+    fake = None
+
+    def log_message(self, *args):
+        pass
+
+    def _serve(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        url = urlparse(self.path)
+        params = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        if self.headers.get("Content-Range"):
+            params["content-range"] = self.headers["Content-Range"]
+        if url.path.rstrip("/").endswith("/batch/bigquery/v2"):
+            status, headers, content = self.fake.handle_batch(
+                self.headers.get("Content-Type"), body)
+        else:
+            status, headers, content = self.fake.handle(self.command,
+                url.path, params, body)
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = _serve
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+def serve(fake, port=0):
+    """Starts serving fake on a background thread; returns the server.
+    fake.url is set to the server's address."""
+    class BoundHandler(Handler):
+        pass
+    BoundHandler.fake = fake
+    server = Server(("127.0.0.1", port), BoundHandler)
+    fake.url = "http://127.0.0.1:%d" % server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+class StubCredentials(object):
+    """Lets a LittleBigQuery talk to the stand-in without credentials."""
+    access_token = "fake"
+    access_token_expired = False
+
+    def authorize(self, http):
+        return http
+
+    def apply(self, headers):
+        headers["authorization"] = "Bearer " + self.access_token
+
+def connect(url, projectId="bench", dataset="bench", **kwargs):
+    """A LittleBigQuery whose requests go to the stand-in at url."""
+    sys.path.insert(0, ROOT)
+    from googleapiclient import discovery
+    from little_big_query import LittleBigQuery
+
+    bq = LittleBigQuery(projectId, dataset, **kwargs)
+    bq.credentials = StubCredentials()
+    document = json.loads(bq._discovery_document())
+    document["rootUrl"] = url + "/"
+    document["baseUrl"] = url + "/" + document["servicePath"]
+    bq.bigquery_service = discovery.build_from_document(document, http=bq.http)
+    return bq
+
+def main():
+    parser = argparse.ArgumentParser(description="A local BigQuery stand-in")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--project", default="bench")
+    parser.add_argument("--dataset", action="append", default=None)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--job-seconds", type=float, default=0.0)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--page-rows", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--export-root", help="where extract jobs write their shards")
+    parser.add_argument("--shard-rows", type=int, default=50000)
+    parser.add_argument("--rate-limit", type=int, help="requests per second")
+    args = parser.parse_args()
+    fake = FakeBigQuery(args.project, args.dataset or ["bench"], args.latency,
+        args.job_seconds, args.rows, args.page_rows, args.days, args.export_root,
+        args.shard_rows, args.rate_limit)
+    server = serve(fake, args.port)
+    print("listening on %s" % fake.url)
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#! /usr/bin/env python
+#
+# Run LittleBigQuery's benchmark suite against the local BigQuery stand-in
+# in fake_bigquery.py and save the results as JSON, so regressions can be
+# caught without network access or a GCP project.
+#
+# Usage: python benchmarks/run_benchmarks.py [--output results.json]
+#     [--compare baseline.json] [--threshold 0.2] [--repeat 3]
+#     [--latency S] [--rate-limit N] [--only name ...]
+#
+# Covers query() end to end, schema decoding, partitionTable, loads
+# (from GCS, local CSV upload, bulk directory loads, DataFrame, streaming
+# inserts) and metadata calls (desc, showTables, describeTables,
+# createTables/dropTables).
+# With --compare, every benchmark more than threshold slower than in the
+# baseline is reported and the exit status is 1.
+#
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import fake_bigquery
+from little_big_query import ResultCache
+from little_big_query.export import LocalStore
+
+BENCHMARKS = []
+
+def benchmark(name, rows=None):
+    """Registers fn(bq, tmp) as a benchmark.  fn does any setup and
+    returns the callable to time; tmp is a scratch directory."""
+    def register(fn):
+        BENCHMARKS.append((name, rows, fn))
+        return fn
+    return register
+
+def quietly(fn, *args, **kwargs):
+    return lambda: fn(*args, **kwargs)
+
+### query
+@benchmark("query_10k_rows", rows=10000)
+def query_10k(bq, tmp):
+    return quietly(bq.query, "SELECT * FROM [bench.events] LIMIT 10000", use_cache=False)
+
+@benchmark("query_100k_rows", rows=100000)
+def query_100k(bq, tmp):
+    return quietly(bq.query, "SELECT * FROM [bench.events] LIMIT 100000", use_cache=False)
+
+@benchmark("query_chunks_100k_rows", rows=100000)
+def query_chunks_100k(bq, tmp):
+    def run():
+        for _ in bq.query_chunks("SELECT * FROM [bench.events] LIMIT 100000",
+            chunk_rows=25000):
+            pass
+    return run
+
+@benchmark("query_cached", rows=10000)
+def query_cached(bq, tmp):
+    q = "SELECT * FROM [bench.events] LIMIT 10000"
+    bq.cache = ResultCache()
+    bq.query(q)
+    return quietly(bq.query, q)
+
+@benchmark("query_to_file_100k_rows", rows=100000)
+def query_to_file(bq, tmp):
+    return quietly(bq.query_to_file, "SELECT * FROM [bench.events] LIMIT 100000",
+        os.path.join(tmp, "events.arrow"), format="feather", chunk_rows=25000)
+
+@benchmark("query_via_export_100k_rows", rows=100000)
+def query_via_export(bq, tmp):
+    bq.export_uri = "gs://bench/exports"
+    bq.export_store = LocalStore(os.path.join(tmp, "store"))
+    return quietly(bq.query, "SELECT * FROM [bench.events] LIMIT 100000",
+        use_cache=False, via_export=True)
+
+@benchmark("read_table_100k_rows", rows=100000)
+def read_table(bq, tmp):
+    return quietly(bq.read_table, "events")
+
+@benchmark("read_table_2_columns_100k_rows", rows=100000)
+def read_table_columns(bq, tmp):
+    return quietly(bq.read_table, "events", columns=["id", "event_time"])
+
+### decoding
+@benchmark("decode_frame_100k_rows", rows=100000)
+def decode_frame(bq, tmp):
+    fields = fake_bigquery.QUERY_SCHEMA
+    rows = [{"f": [{"v": fake_bigquery._value(f["type"], i)} for f in fields]}
+        for i in range(100000)]
+    return quietly(bq._decode_frame, rows, {"fields": fields})
+
+### partitionTable
+@benchmark("partition_table_30_days")
+def partition_table(bq, tmp):
+    def run():
+        bq.createTableAsSelect("SELECT * FROM [bench.events] LIMIT 1000", "unpartitioned")
+        bq.partitionTable("unpartitioned", "partitioned", "event_time")
+        bq.dropTables(["unpartitioned", "partitioned"])
+    return run
+
+### loads
+@benchmark("load_gcs_csv")
+def load_gcs_csv(bq, tmp):
+    def run():
+        bq.createTableFromCSV("from_gcs", [("id", "INTEGER"), ("email", "STRING")],
+            "gs://bench/csv/*")
+        bq.dropTable("from_gcs")
+    return run
+
+@benchmark("load_local_csv_100k_rows", rows=100000)
+def load_local_csv(bq, tmp):
+    path = os.path.join(tmp, "events.csv")
+    with open(path, "w") as f:
+        for i in range(100000):
+            f.write("%d,user%d@example.com,%d.5\n" % (i, i, i % 1000))
+    def run():
+        bq.createTableFromLocalCSV("from_csv", [("id", "INTEGER"),
+            ("email", "STRING"), ("amount", "FLOAT")], path)
+        bq.dropTable("from_csv")
+    return run
+
+@benchmark("bulk_load_local_dir_100_files", rows=100000)
+def bulk_load_local_dir(bq, tmp):
+    directory = os.path.join(tmp, "daily")
+    os.mkdir(directory)
+    for day in range(100):
+        with open(os.path.join(directory, "day_%03d.csv" % day), "w") as f:
+            f.write("id,email\n")
+            for i in range(1000):
+                f.write("%d,user%d@example.com\n" % (i, i))
+    return quietly(bq.bulkLoad, "from_dir", [("id", "INTEGER"), ("email", "STRING")],
+        [directory], skipLeadingRows=1, writeDisposition="WRITE_TRUNCATE")
+
+@benchmark("load_frame_100k_rows", rows=100000)
+def load_frame(bq, tmp):
+    frame = bq.query("SELECT * FROM [bench.events] LIMIT 100000", use_cache=False)
+    def run():
+        bq.createTableFromFrame(frame, "from_frame")
+        bq.dropTable("from_frame")
+    return run
+
+@benchmark("insert_rows_10k", rows=10000)
+def insert_rows(bq, tmp):
+    rows = [{"id": i, "email": "user%d@example.com" % i} for i in range(10000)]
+    return quietly(bq.insert_rows, "streamed", rows)
+
+### metadata
+@benchmark("desc_50_tables")
+def desc(bq, tmp):
+    def run():
+        for i in range(50):
+            bq.desc("meta_%d" % i)
+    return run
+
+@benchmark("show_tables_500")
+def show_tables(bq, tmp):
+    return quietly(bq.tables)
+
+@benchmark("describe_tables_500")
+def describe_tables(bq, tmp):
+    return quietly(bq.describeTables, ["meta_%d" % i for i in range(500)])
+
+@benchmark("create_drop_tables_200")
+def create_drop_tables(bq, tmp):
+    schema = [("id", "INTEGER"), ("email", "STRING")]
+    names = ["scratch_%d" % i for i in range(200)]
+    def run():
+        bq.createTables([(n, schema) for n in names])
+        bq.dropTables(names)
+    return run
+
+def setup(fake):
+    """The tables the benchmarks read."""
+    tables = fake.datasets["bench"]
+    tables["events"] = {"schema": fake_bigquery.QUERY_SCHEMA, "rows": 100000,
+        "partitions": set(), "insertIds": set(), "timePartitioning": None,
+        "view": None}
+    tables["streamed"] = dict(tables["events"], rows=0, insertIds=set())
+    for i in range(500):
+        tables["meta_%d" % i] = dict(tables["events"], rows=i, insertIds=set())
+
+def run_suite(args):
+    tmp = tempfile.mkdtemp()
+    fake = fake_bigquery.FakeBigQuery(latency=args.latency,
+        job_seconds=args.job_seconds, page_rows=args.page_rows,
+        export_root=os.path.join(tmp, "store"), rate_limit=args.rate_limit)
+    server = fake_bigquery.serve(fake)
+    results = {}
+    try:
+        for name, rows, fn in BENCHMARKS:
+            if args.only and name not in args.only:
+                continue
+            # a fresh client per benchmark, so no cache carries over
+            bq = fake_bigquery.connect(fake.url, progress=None)
+            setup(fake)
+            run = fn(bq, tmp)
+            times = []
+            requests = fake.requests
+            try:
+                for _ in range(args.repeat):
+                    start = time.time()
+                    run()
+                    times.append(time.time() - start)
+            finally:
+                bq.http.close()
+            times.sort()
+            result = {"best": times[0], "median": times[len(times) // 2],
+                "runs": times, "requests": (fake.requests - requests) // args.repeat}
+            if rows:
+                result["rows_per_second"] = rows / times[0]
+            results[name] = result
+            print("%-32s %10.4f s %10.4f s %8d req%s" % (name, result["best"],
+                result["median"], result["requests"], "  %12.0f rows/s"
+                % result["rows_per_second"] if rows else ""))
+            sys.stdout.flush()
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(tmp)
+    return results
+
+def compare(results, baseline, threshold):
+    """Prints how every benchmark moved against baseline; returns the
+    names of those more than threshold slower."""
+    regressions = []
+    print("\n%-32s %10s %10s %8s" % ("benchmark", "baseline", "now", "change"))
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        old, new = baseline[name]["best"], results[name]["best"]
+        change = new / old - 1 if old else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("%-32s %10.4f %10.4f %+7.1f%%%s" % (name, old, new, change * 100, flag))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="LittleBigQuery benchmark suite")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="a previous --output to check against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+        help="the slowdown, as a fraction, reported as a regression")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0,
+        help="seconds the stand-in waits before every response")
+    parser.add_argument("--job-seconds", type=float, default=0.0)
+    parser.add_argument("--page-rows", type=int, default=10000)
+    parser.add_argument("--rate-limit", type=int,
+        help="requests per second the stand-in answers before throttling")
+    parser.add_argument("--only", nargs="*", help="benchmark names to run")
+    args = parser.parse_args()
+
+    results = run_suite(args)
+    report = {"python": platform.python_version(), "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {"repeat": args.repeat, "latency": args.latency,
+            "job_seconds": args.job_seconds, "page_rows": args.page_rows,
+            "rate_limit": args.rate_limit},
+        "benchmarks": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print("\nwrote %s" % args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["benchmarks"]
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
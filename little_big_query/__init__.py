@@ -1 +1,26 @@
-from little_big_query import LittleBigQuery
\ No newline at end of file
+from .little_big_query import LittleBigQuery, Backoff, Job
+from .cache import MetadataCache, ResultCache
+from .streaming import StreamWriter
+from .spool import SpoolWriter, open_spool
+from .export import GCSStore, LocalStore
+from .transport import HttpPool
+from .ratelimit import RateLimiter
+from .instrumentation import Instrumentation
+
+__all__ = ["LittleBigQuery", "Backoff", "Job", "MetadataCache", "ResultCache",
+    "StreamWriter", "SpoolWriter", "open_spool", "GCSStore", "LocalStore",
+    "HttpPool", "RateLimiter", "Instrumentation"]
+
+import sys
+if sys.version_info >= (3, 5):
+    # from little_big_query import * looks it up, through __getattr__ below
+    __all__.append("AsyncLittleBigQuery")
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        # aio imports aiohttp, which is slow to load, so only on first use
+        if name == "AsyncLittleBigQuery":
+            from .aio import AsyncLittleBigQuery
+            return AsyncLittleBigQuery
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+elif sys.version_info >= (3, 5):
+    from .aio import AsyncLittleBigQuery
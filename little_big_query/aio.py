@@ -0,0 +1,476 @@
+#! /usr/bin/env python
+#
+# AsyncLittleBigQuery, an asyncio client for BigQuery (Python 3.5+)
+#
+import asyncio
+import json
+import time
+
+from googleapiclient.errors import HttpError
+import httplib2
+
+from .little_big_query import (LittleBigQuery, LittleBigQueryException,
+    _reattachable, _retry_id)
+from .ratelimit import is_throttled
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+API_ROOT = "https://bigquery.googleapis.com/bigquery/v2/"
+
+class AsyncLittleBigQuery(object):
+    """
+    The asyncio counterpart of LittleBigQuery.  Requests go through one
+    aiohttp session, with at most max_concurrency of them in flight;
+    jobs are polled with asyncio.sleep on the backoff schedule and
+    result pages are fetched concurrently, so one event loop can drive
+    hundreds of jobs at once.  Decoding, caching and the credentials
+    are shared with a (never connected) LittleBigQuery.
+
+    Attributes:
+        projectId: the current projectId
+        max_concurrency: the most requests in flight at once
+        fetch_workers: the most result pages fetched at once per query
+        idempotent_jobs, run_key: derive job IDs from the job
+            configuration, as LittleBigQuery does
+        rate_limiter, priority: as for LittleBigQuery; a RateLimiter
+            can be shared with blocking clients
+
+    async with AsyncLittleBigQuery(<yourProjectId>, <datasetId>) as bq:
+        frame = await bq.query("SELECT emp FROM dep;")
+    """
+
+    def __init__(self, projectId, dataset=None, max_concurrency=32,
+        fetch_workers=8, page_size=None, backoff=None, cache=None,
+        catalog=None, session=None, max_retries=5, idempotent_jobs=False,
+        rate_limiter=None, priority="INTERACTIVE", run_key=None):
+        if aiohttp is None:
+            raise ImportError("AsyncLittleBigQuery needs aiohttp")
+        self._bq = LittleBigQuery(projectId, dataset, page_size=page_size,
+            backoff=backoff, cache=cache, catalog=catalog,
+            idempotent_jobs=idempotent_jobs, rate_limiter=rate_limiter,
+            priority=priority, run_key=run_key)
+        self.max_concurrency = max_concurrency
+        self.fetch_workers = fetch_workers
+        self.max_retries = max_retries
+        self._session = session
+        self._own_session = session is None
+        # asyncio primitives bind to a loop, so they are made on first use
+        self._limit = None
+        self._token_lock = None
+        self._credentials = None
+
+    @property
+    def project_id(self):
+        return self._bq.project_id
+
+    @property
+    def dataset(self):
+        return self._bq.dataset
+
+    @property
+    def backoff(self):
+        return self._bq.backoff
+
+    def useDataset(self, datasetId):
+        self._bq.useDataset(datasetId)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None and self._own_session:
+            await self._session.close()
+            self._session = None
+
+    def _dataset_or_default(self, datasetId):
+        if not datasetId:
+            if not self.dataset:
+                raise LittleBigQueryException("No datasetId specified.")
+            return self.dataset
+        return datasetId
+
+    async def _token(self, force=False):
+        """Returns an access token, refreshing it (once, for every
+        waiting request) in an executor when it has expired."""
+        loop = asyncio.get_event_loop()
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            if self._credentials is None:
+                self._credentials = await loop.run_in_executor(None,
+                    lambda: self._bq.credentials)
+            credentials = self._credentials
+            if force or credentials.access_token is None \
+                or credentials.access_token_expired:
+                await loop.run_in_executor(None, credentials.refresh,
+                    httplib2.Http())
+            return credentials.access_token
+
+    async def _request(self, method, path, params=None, body=None):
+        """Sends one API request and returns the decoded JSON response.
+        Every request waits for the rate limiter first.  Rate limit and
+        quota errors are retried once the limiter has backed off; 5xx
+        and 408 answers and dropped connections on the backoff schedule;
+        other errors raise HttpError, as the blocking client does.
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_concurrency)
+        url = API_ROOT + path
+        params = dict((k, str(v)) for k, v in (params or {}).items()
+            if v is not None)
+        limiter = self._bq.rate_limiter
+        delays = self.backoff.delays()
+        attempt = 0
+        refreshed = False
+        while True:
+            wait = limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            headers = {"Authorization": "Bearer %s" % await self._token()}
+            try:
+                async with self._limit:
+                    async with self._session.request(method, url, params=params,
+                        json=body, headers=headers) as resp:
+                        status = resp.status
+                        content = await resp.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                await asyncio.sleep(next(delays))
+                continue
+
+            if status < 300:
+                limiter.succeeded()
+                return json.loads(content.decode("utf-8")) if content else {}
+            if is_throttled(status, content) and attempt < self.max_retries:
+                attempt += 1
+                limiter.throttled()
+                continue
+            if status == 401 and not refreshed:
+                refreshed = True
+                await self._token(force=True)
+                continue
+            if (status >= 500 or status == 408) and attempt < self.max_retries:
+                attempt += 1
+                await asyncio.sleep(next(delays))
+                continue
+            raise HttpError(httplib2.Response({"status": status}), content, uri=url)
+
+    ### jobs
+    async def _insert_job(self, configuration):
+        """Inserts a job, or reattaches to the job with its ID if there
+        is one; see LittleBigQuery._insert_job."""
+        request = {
+            "jobReference": self._bq._job_reference(configuration),
+            "configuration": configuration
+        }
+        job_id = request["jobReference"]["jobId"]
+        attempt = 0
+        while True:
+            try:
+                return await self._request("POST", "projects/%s/jobs" % self.project_id,
+                    body=request)
+            except HttpError as e:
+                if e.resp.status != 409:
+                    raise
+            existing = await self._request("GET", "projects/%s/jobs/%s" % (
+                self.project_id, request["jobReference"]["jobId"]))
+            if _reattachable(existing, request):
+                return existing
+            attempt += 1
+            request["jobReference"]["jobId"] = _retry_id(job_id, attempt)
+
+    async def wait(self, job):
+        """Waits for a job to finish and returns the finished job
+        resource, raising RuntimeError if the job failed."""
+        jobReference = job["jobReference"]
+        path = "projects/%s/jobs/%s" % (jobReference.get("projectId",
+            self.project_id), jobReference["jobId"])
+        delays = self.backoff.delays()
+        start = time.time()
+        while True:
+            if job.get("status", {}).get("state") == "DONE":
+                if "errorResult" in job["status"]:
+                    raise RuntimeError(job["status"]["errorResult"])
+                return job
+            remaining = self.backoff.remaining(start)
+            if remaining <= 0:
+                raise LittleBigQueryException("Timed out waiting for job %s"
+                    % jobReference["jobId"])
+            await asyncio.sleep(min(next(delays), remaining))
+            job = await self._request("GET", path)
+
+    async def wait_all(self, jobs):
+        """Waits for every job in jobs and returns them finished, in order."""
+        return await asyncio.gather(*[self.wait(job) for job in jobs])
+
+    async def _write_job(self, configuration, tableName, datasetId):
+        self._bq._invalidate(tableName, datasetId)
+        job = await self.wait(await self._insert_job(configuration))
+        self._bq._invalidate(tableName, datasetId)
+        return job
+
+    ### queries
+    async def query(self, q, raw=False, use_cache=True, cache_ttl=None,
+        dry_run=False, maximumBytesBilled=None, priority=None):
+        """
+        Runs a query and returns the result as a pandas data frame, or
+        the raw getQueryResults response with every row when raw is set.
+        Decoding runs in an executor so the loop keeps serving requests.
+        """
+        if dry_run:
+            return await self.estimate(q)
+        cache = self._bq.cache
+        key = None
+        if cache is not None and not raw and use_cache:
+            key = cache.key(q, self.project_id, self.dataset)
+            frame = cache.get(key)
+            if frame is not None:
+                return frame
+
+        job = await self.wait(await self.submit_query(q, maximumBytesBilled,
+            priority=priority))
+        results = await self._fetch_results(job["jobReference"])
+        if raw:
+            return results
+        loop = asyncio.get_event_loop()
+        frame = await loop.run_in_executor(None, self._bq._decode_frame,
+            results["rows"], results["schema"])
+        if key is not None:
+            cache.put(key, frame, self._bq._referenced_tables(job), cache_ttl)
+        return frame
+
+    async def submit_query(self, q, maximumBytesBilled=None, dryRun=False,
+        priority=None):
+        """Inserts a query job and returns the job resource without
+        waiting for it; pass it to wait()."""
+        configuration = {
+            "query": {
+                "query": q,
+                "defaultDataset": {
+                    "projectId": self.project_id,
+                    "datasetId": self.dataset
+                },
+                "priority": priority or self._bq.priority
+            }
+        }
+        if dryRun:
+            configuration["dryRun"] = True
+        if maximumBytesBilled is not None:
+            configuration["query"]["maximumBytesBilled"] = str(int(maximumBytesBilled))
+        return await self._insert_job(configuration)
+
+    async def estimate(self, q):
+        """Dry-runs a query; see LittleBigQuery.estimate."""
+        return self._bq._summarize_dry_run(await self.submit_query(q, dryRun=True))
+
+    async def _get_query_results(self, jobReference, **params):
+        if self._bq.page_size and "maxResults" not in params:
+            params["maxResults"] = self._bq.page_size
+        return await self._request("GET", "projects/%s/queries/%s" % (
+            jobReference["projectId"], jobReference["jobId"]), params=params)
+
+    async def _fetch_range(self, jobReference, start, count, limit):
+        rows = []
+        async with limit:
+            while len(rows) < count:
+                page = await self._get_query_results(jobReference,
+                    startIndex=start + len(rows), maxResults=count - len(rows))
+                page_rows = page.get("rows", [])
+                if not page_rows:
+                    break
+                rows.extend(page_rows)
+        return rows
+
+    async def _fetch_results(self, jobReference):
+        """Like LittleBigQuery._fetch_results: the first page gives
+        totalRows and the remaining ranges are fetched concurrently,
+        fetch_workers at a time."""
+        first = await self._get_query_results(jobReference)
+        rows = first.get("rows", [])
+        total = int(first.get("totalRows", len(rows)))
+        if len(rows) < total:
+            page_size = self._bq.page_size or len(rows) or total
+            limit = asyncio.Semaphore(self.fetch_workers)
+            pages = await asyncio.gather(*[
+                self._fetch_range(jobReference, start, count, limit)
+                for start, count in self._bq._page_ranges(len(rows), total, page_size)])
+            for p in pages:
+                rows.extend(p)
+        first["rows"] = rows
+        first.pop("pageToken", None)
+        return first
+
+    ### tables
+    async def desc(self, tableName, datasetId=None):
+        datasetId = datasetId or self.dataset
+        catalog = self._bq.catalog
+        if catalog is not None:
+            fields = catalog.get("schema", self.project_id, datasetId, tableName)
+            if fields is not None:
+                return fields
+        table = await self._request("GET", "projects/%s/datasets/%s/tables/%s" % (
+            self.project_id, datasetId, tableName))
+        fields = table["schema"]["fields"]
+        if catalog is not None:
+            catalog.put("schema", fields, self.project_id, datasetId, tableName)
+        return fields
+
+    async def showTables(self, datasetId=None):
+        datasetId = self._dataset_or_default(datasetId)
+        catalog = self._bq.catalog
+        listing = None
+        if catalog is not None:
+            listing = catalog.get("tables", self.project_id, datasetId)
+        if listing is None:
+            listing = await self._list_all("projects/%s/datasets/%s/tables" % (
+                self.project_id, datasetId), "tables")
+            if catalog is not None:
+                catalog.put("tables", listing, self.project_id, datasetId)
+        return [x["tableReference"]["tableId"] for x in listing]
+
+    async def _list_all(self, path, field):
+        items = []
+        params = {}
+        while True:
+            page = await self._request("GET", path, params=params)
+            items.extend(page.get(field, []))
+            if not page.get("nextPageToken"):
+                return items
+            params["pageToken"] = page["nextPageToken"]
+
+    async def createTable(self, tableName, datasetId=None, schema=None):
+        datasetId = datasetId or self.dataset
+        await self._request("POST", "projects/%s/datasets/%s/tables" % (
+            self.project_id, datasetId),
+            body=self._bq._table_body(tableName, datasetId, schema))
+        self._bq._invalidate(tableName, datasetId)
+
+    async def dropTable(self, tableId, datasetId=None):
+        datasetId = self._dataset_or_default(datasetId)
+        await self._request("DELETE", "projects/%s/datasets/%s/tables/%s" % (
+            self.project_id, datasetId, tableId))
+        self._bq._invalidate(tableId, datasetId)
+
+    async def createTableAsSelect(self, q, tableName, datasetId=None,
+        partitionField=None, clusteringFields=None, priority=None, standardSQL=False):
+        datasetId = self._dataset_or_default(datasetId)
+        return await self._query_to_table(q, tableName, datasetId, "WRITE_EMPTY",
+            partitionField=partitionField, clusteringFields=clusteringFields,
+            priority=priority, standardSQL=standardSQL)
+
+    async def appendTableAsSelect(self, q, tableName, datasetId=None,
+        createDisposition="CREATE_IF_NEEDED", partitionField=None, clusteringFields=None,
+        priority=None, standardSQL=False):
+        datasetId = self._dataset_or_default(datasetId)
+        return await self._query_to_table(q, tableName, datasetId, "WRITE_APPEND",
+            createDisposition, partitionField, clusteringFields, priority, standardSQL)
+
+    async def replaceTableAsSelect(self, q, tableName, datasetId=None, swap=False,
+        partitionField=None, clusteringFields=None, priority=None, standardSQL=False):
+        """See LittleBigQuery.submit_replaceTableAsSelect."""
+        datasetId = self._dataset_or_default(datasetId)
+        if not swap:
+            return await self._query_to_table(q, tableName, datasetId, "WRITE_TRUNCATE",
+                partitionField=partitionField, clusteringFields=clusteringFields,
+                priority=priority, standardSQL=standardSQL)
+        staging = self._bq._swap_staging(tableName, None, q, datasetId,
+            partitionField, clusteringFields, standardSQL)
+        await self._query_to_table(q, staging, datasetId, "WRITE_TRUNCATE",
+            partitionField=partitionField, clusteringFields=clusteringFields,
+            priority=priority, standardSQL=standardSQL)
+        try:
+            return await self._write_job({
+                "copy": {
+                    "sourceTable": {"projectId": self.project_id,
+                        "datasetId": datasetId, "tableId": staging},
+                    "destinationTable": {"projectId": self.project_id,
+                        "datasetId": datasetId, "tableId": tableName},
+                    "writeDisposition": "WRITE_TRUNCATE"
+                }
+            }, tableName, datasetId)
+        finally:
+            await self.dropTable(staging, datasetId)
+
+    async def _query_to_table(self, q, tableName, datasetId, writeDisposition=None,
+        createDisposition="CREATE_IF_NEEDED", partitionField=None, clusteringFields=None,
+        priority=None, standardSQL=False):
+        standardSQL = self._bq._standard_sql(q, standardSQL, partitionField,
+            clusteringFields)
+        configuration = {
+            "query": {
+                "query": q,
+                "priority": priority or self._bq.priority,
+                "destinationTable": {
+                    "projectId": self.project_id,
+                    "datasetId": datasetId,
+                    "tableId": tableName
+                },
+                "createDisposition": createDisposition
+            }
+        }
+        if standardSQL:
+            configuration["query"]["useLegacySql"] = False
+        else:
+            configuration["query"]["allowLargeResults"] = True
+        if writeDisposition:
+            configuration["query"]["writeDisposition"] = writeDisposition
+        if partitionField:
+            configuration["query"]["timePartitioning"] = {"type": "DAY",
+                "field": partitionField}
+        if clusteringFields:
+            configuration["query"]["clustering"] = {"fields": list(clusteringFields)}
+        return await self._write_job(configuration, tableName, datasetId)
+
+    ### loads from Cloud Storage
+    async def createTableFromCSV(self, tableName, schema, gcs_path, datasetId=None):
+        return await self._load(tableName, schema, gcs_path, datasetId, "CSV")
+
+    async def appendTableFromCSV(self, tableName, schema, gcs_path, datasetId=None):
+        return await self._load(tableName, schema, gcs_path, datasetId, "CSV",
+            "WRITE_APPEND")
+
+    async def createTableFromJSON(self, tableName, schema, gcs_path, datasetId=None):
+        return await self._load(tableName, schema, gcs_path, datasetId,
+            "NEWLINE_DELIMITED_JSON")
+
+    async def appendTableFromJSON(self, tableName, schema, gcs_path, datasetId=None):
+        return await self._load(tableName, schema, gcs_path, datasetId,
+            "NEWLINE_DELIMITED_JSON", "WRITE_APPEND")
+
+    async def createTableFromAvro(self, tableName, schema, gcs_path, datasetId=None):
+        return await self._load(tableName, schema, gcs_path, datasetId, "AVRO")
+
+    async def appendTableFromAvro(self, tableName, schema, gcs_path, datasetId=None):
+        return await self._load(tableName, schema, gcs_path, datasetId, "AVRO",
+            "WRITE_APPEND")
+
+    async def _load(self, tableName, schema, gcs_path, datasetId, sourceFormat,
+        writeDisposition=None):
+        datasetId = self._dataset_or_default(datasetId)
+        configuration = {
+            "load": {
+                "sourceUris": [gcs_path],
+                "schema": {
+                    "fields": [{"name": i[0], "type": i[-1]} for i in schema]
+                },
+                "destinationTable": {
+                    "projectId": self.project_id,
+                    "datasetId": datasetId,
+                    "tableId": tableName
+                },
+                "sourceFormat": sourceFormat
+            }
+        }
+        if writeDisposition:
+            configuration["load"]["writeDisposition"] = writeDisposition
+        return await self._write_job(configuration, tableName, datasetId)
@@ -0,0 +1,219 @@
+#! /usr/bin/env python
+#
+# Result and metadata caching for LittleBigQuery
+#
+from collections import OrderedDict
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from .lazy import LazyModule
+
+pd = LazyModule("pandas")
+pa = LazyModule("pyarrow")
+
+# string literals and quoted identifiers are left untouched when
+# normalizing query text
+_QUOTED = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)""")
+
+def normalize_query(q):
+    """
+    Collapses whitespace outside of quotes and drops a trailing
+    semicolon, so trivially different spellings of a query share a key.
+    >>> normalize_query("SELECT  a\\n FROM t WHERE b = 'x  y' ;")
+    "SELECT a FROM t WHERE b = 'x  y'"
+    """
+    parts = _QUOTED.split(q)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", parts[i])
+    return "".join(parts).strip().rstrip(";").strip()
+
+def table_key(projectId, datasetId, tableId):
+    """Identifies a table for invalidation, ignoring partition decorators."""
+    return (projectId, datasetId, tableId.split("$")[0])
+
+class ResultCache(object):
+    """
+    An LRU cache of query result frames, bounded by their in-memory
+    size, with an optional on-disk tier of Parquet files that survives
+    restarts.  Entries expire after ttl seconds and are dropped when a
+    table they read from is written to through LittleBigQuery.
+
+    Attributes:
+        max_bytes: the memory budget for cached frames
+        ttl: the default lifetime of an entry, in seconds
+        directory: where the on-disk tier lives (None keeps everything in memory)
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=300, directory=None):
+        if directory is not None:
+            # pandas reads and writes the Parquet files through pyarrow
+            if not hasattr(pa, "Table"):
+                raise ImportError("The on-disk result cache needs pyarrow")
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def key(self, q, projectId, datasetId):
+        text = json.dumps([normalize_query(q), projectId, datasetId])
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns a copy of the cached frame, or None."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                if entry["expires"] > time.time():
+                    # re-insert to mark as most recently used
+                    self._entries[key] = entry
+                    return entry["frame"].copy()
+                self._bytes -= entry["bytes"]
+        if self.directory is None:
+            return None
+        meta = self._read_meta(key)
+        if meta is None:
+            return None
+        if meta["expires"] <= time.time():
+            self._remove_file(key)
+            return None
+        frame = pd.read_parquet(self._path(key, ".parquet"))
+        # newer pandas reads strings back as a string dtype
+        for c in meta.get("object_columns", []):
+            frame[c] = frame[c].astype(object)
+        self._remember(key, frame, meta["tables"], meta["expires"])
+        return frame.copy()
+
+    def put(self, key, frame, tables=(), ttl=None):
+        """Caches frame under key.  tables lists the (projectId,
+        datasetId, tableId) keys the result was read from.
+        """
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        tables = [list(t) for t in tables]
+        self._remember(key, frame, tables, expires)
+        if self.directory is not None:
+            frame.to_parquet(self._path(key, ".parquet"))
+            with open(self._path(key, ".json"), "w") as f:
+                json.dump({"expires": expires, "tables": tables,
+                    "object_columns": [c for c in frame.columns
+                        if frame[c].dtype == object]}, f)
+
+    def invalidate(self, table):
+        """Drops every entry that read from table."""
+        table = list(table)
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if table in entry["tables"]:
+                    self._bytes -= entry["bytes"]
+                    del self._entries[key]
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    key = name[:-len(".json")]
+                    meta = self._read_meta(key)
+                    if meta is not None and table in meta["tables"]:
+                        self._remove_file(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    self._remove_file(name[:-len(".json")])
+
+    def _remember(self, key, frame, tables, expires):
+        size = int(frame.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old["bytes"]
+            self._entries[key] = {"frame": frame, "bytes": size,
+                "tables": tables, "expires": expires}
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted["bytes"]
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def _read_meta(self, key):
+        try:
+            with open(self._path(key, ".json")) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _remove_file(self, key):
+        for suffix in (".json", ".parquet"):
+            try:
+                os.remove(self._path(key, suffix))
+            except OSError:
+                pass
+
+class MetadataCache(object):
+    """
+    A TTL cache of table schemas, table listings, dataset listings and
+    partition listings.  Writes made through LittleBigQuery drop the
+    entries they affect.
+
+    Attributes:
+        ttls: seconds to keep each kind of entry ("schema", "tables",
+            "datasets", "partitions")
+    """
+
+    def __init__(self, schema_ttl=3600, table_ttl=300, dataset_ttl=300,
+        partition_ttl=60):
+        self.ttls = {"schema": schema_ttl, "tables": table_ttl,
+            "datasets": dataset_ttl, "partitions": partition_ttl}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind, *key):
+        """Returns a copy of the cached value, or None."""
+        with self._lock:
+            entry = self._entries.get((kind,) + key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[(kind,) + key]
+                return None
+            return copy.deepcopy(entry[1])
+
+    def put(self, kind, value, *key):
+        with self._lock:
+            self._entries[(kind,) + key] = (time.time() + self.ttls[kind],
+                copy.deepcopy(value))
+
+    def invalidate_table(self, projectId, datasetId, tableId):
+        """Drops the schema and partitions of a table, and the listing
+        of its dataset."""
+        tableId = tableId.split("$")[0]
+        with self._lock:
+            for key in (("schema", projectId, datasetId, tableId),
+                ("partitions", projectId, datasetId, tableId),
+                ("tables", projectId, datasetId)):
+                self._entries.pop(key, None)
+
+    def invalidate_dataset(self, projectId, datasetId):
+        """Drops everything cached about a dataset, and the dataset listing."""
+        with self._lock:
+            for key in list(self._entries):
+                if key[1:3] == (projectId, datasetId) or key == ("datasets", projectId):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
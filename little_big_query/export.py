@@ -0,0 +1,161 @@
+#! /usr/bin/env python
+#
+# Object stores and shard readers for export-based extraction and bulk loads
+#
+import fnmatch
+import gzip
+import json
+import os
+import shutil
+
+try:
+    from urllib import quote
+except ImportError:
+    from urllib.parse import quote
+
+from googleapiclient.errors import HttpError
+
+from .lazy import LazyModule
+
+fastavro = LazyModule("fastavro")
+
+# extract job formats the shard readers understand, and the codec each
+# is compressed with by default
+EXPORT_COMPRESSION = {"NEWLINE_DELIMITED_JSON": "GZIP", "AVRO": "SNAPPY"}
+
+# bytes fetched per ranged GET when downloading a shard
+DOWNLOAD_CHUNKSIZE = 32 * 1024 * 1024
+
+STORAGE_API = "https://storage.googleapis.com/storage/v1/"
+
+def split_uri(uri):
+    """
+    >>> split_uri("gs://bucket/exports/job/part-*.json.gz")
+    ('bucket', 'exports/job/part-*.json.gz')
+    """
+    if not uri.startswith("gs://"):
+        raise ValueError("Not a gs:// URI: %s" % uri)
+    bucket, _, name = uri[len("gs://"):].partition("/")
+    return bucket, name
+
+class GCSStore(object):
+    """
+    Lists, downloads and deletes Google Cloud Storage objects (the
+    shards extract jobs write, the files bulk loads read) through the
+    JSON API and an authorized http (such as LittleBigQuery.http).
+    """
+
+    def __init__(self, http):
+        self.http = http
+
+    def list(self, pattern):
+        """The gs:// URIs matching pattern, which may contain * wildcards."""
+        return [uri for uri, size in self.sizes(pattern)]
+
+    def sizes(self, pattern):
+        """(uri, bytes) for every object matching pattern, sorted by uri."""
+        bucket, name = split_uri(pattern)
+        prefix = name.split("*")[0]
+        objects = []
+        pageToken = None
+        while True:
+            url = "%sb/%s/o?prefix=%s&fields=items(name,size),nextPageToken" % (
+                STORAGE_API, bucket, quote(prefix, safe=""))
+            if pageToken:
+                url += "&pageToken=" + quote(pageToken, safe="")
+            page = json.loads(self._request(url)[1].decode("utf-8"))
+            objects.extend(("gs://%s/%s" % (bucket, o["name"]), int(o.get("size", 0)))
+                for o in page.get("items", []) if fnmatch.fnmatchcase(o["name"], name))
+            pageToken = page.get("nextPageToken")
+            if not pageToken:
+                return sorted(objects)
+
+    def download(self, uri, f):
+        """Writes the object at uri to the binary file f, one ranged
+        request at a time so no more than a chunk is held in memory."""
+        url = self._object_url(uri) + "?alt=media"
+        start = 0
+        while True:
+            resp, content = self._request(url, headers={"range": "bytes=%d-%d"
+                % (start, start + DOWNLOAD_CHUNKSIZE - 1)}, ok=(200, 206, 416))
+            if resp.status == 416:
+                return
+            f.write(content)
+            start += len(content)
+            if resp.status == 200 or len(content) < DOWNLOAD_CHUNKSIZE:
+                return
+
+    def delete(self, uri):
+        self._request(self._object_url(uri), "DELETE", ok=(200, 204, 404))
+
+    def _object_url(self, uri):
+        bucket, name = split_uri(uri)
+        return "%sb/%s/o/%s" % (STORAGE_API, bucket, quote(name, safe=""))
+
+    def _request(self, url, method="GET", headers=None, ok=(200,)):
+        resp, content = self.http.request(url, method, headers=headers)
+        if resp.status not in ok:
+            raise HttpError(resp, content, uri=url)
+        return resp, content
+
+class LocalStore(object):
+    """
+    A stand-in for Cloud Storage on the local filesystem:
+    gs://bucket/name lives at root/bucket/name.  Lets export-based
+    extraction and bulk loads run offline, against a fake BigQuery that
+    writes its extract shards there.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, uri):
+        bucket, name = split_uri(uri)
+        return os.path.join(self.root, bucket, *name.split("/"))
+
+    def list(self, pattern):
+        bucket, name = split_uri(pattern)
+        directory = os.path.dirname(self.path(pattern))
+        if not os.path.isdir(directory):
+            return []
+        prefix = "/".join(name.split("/")[:-1])
+        return sorted("gs://%s/%s" % (bucket, "/".join([prefix, f]) if prefix else f)
+            for f in os.listdir(directory) if fnmatch.fnmatchcase(f, name.split("/")[-1]))
+
+    def sizes(self, pattern):
+        return [(uri, os.path.getsize(self.path(uri))) for uri in self.list(pattern)]
+
+    def download(self, uri, f):
+        with open(self.path(uri), "rb") as src:
+            shutil.copyfileobj(src, f)
+
+    def delete(self, uri):
+        try:
+            os.remove(self.path(uri))
+        except OSError:
+            pass
+
+def read_shard(path, fields, format="NEWLINE_DELIMITED_JSON"):
+    """
+    Reads one downloaded extract shard into a list of values per field.
+    JSON shards may be gzipped; Avro shards need fastavro.
+    """
+    names = [f["name"] for f in fields]
+    columns = [[] for _ in names]
+    if format == "AVRO":
+        with open(path, "rb") as f:
+            for record in fastavro.reader(f):
+                for column, name in zip(columns, names):
+                    column.append(record.get(name))
+        return columns
+    with open(path, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    opener = gzip.open if gzipped else open
+    with opener(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line.decode("utf-8"))
+            for column, name in zip(columns, names):
+                column.append(record.get(name))
+    return columns
@@ -0,0 +1,125 @@
+#! /usr/bin/env python
+#
+# Timings, counters and trace spans for LittleBigQuery
+#
+from contextlib import contextmanager
+import threading
+import time
+import uuid
+
+class Span(object):
+    """
+    One timed operation.  Spans opened inside another one on the same
+    thread (or given it as parent) share its trace_id and record it as
+    their parent_id.  Code inside the span may add to tags.
+    """
+
+    def __init__(self, name, tags, parent=None, trace_id=None):
+        self.name = name
+        self.tags = tags
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = trace_id or (parent.trace_id if parent is not None
+            else uuid.uuid4().hex)
+        self.start = time.time()
+
+class Instrumentation(object):
+    """
+    Collects what LittleBigQuery is spending its time on: a span for
+    every API request, job insert, job poll, result fetch and decode,
+    and counters for polls, retries, rows and bytes received.
+
+    Every event is handed to callback as a dict, one of
+        {"type": "span", "name", "seconds", "tags", "trace_id", "span_id", "parent_id"}
+        {"type": "count", "name", "value", "tags", "trace_id", "span_id"}
+    and added to the running totals returned by summary().  Override
+    emit() to forward events to a metrics registry or tracer instead.
+
+    >>> inst = Instrumentation()
+    >>> with inst.span("query", q="select 1"):
+    ...     inst.count("rows", 10)
+    >>> inst.summary()["rows"]["total"]
+    10
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._local = threading.local()
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The innermost open span on this thread, or None.  Pass it as
+        parent to spans opened on worker threads."""
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, parent=None, trace_id=None, **tags):
+        """Times the body of a with block, yielding its Span."""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        span = Span(name, tags, parent or self.current(), trace_id)
+        stack.append(span)
+        try:
+            yield span
+        except Exception as e:
+            span.tags["error"] = type(e).__name__
+            raise
+        finally:
+            stack.pop()
+            self.emit({"type": "span", "name": name,
+                "seconds": time.time() - span.start, "tags": span.tags,
+                "trace_id": span.trace_id, "span_id": span.span_id,
+                "parent_id": span.parent_id})
+
+    def count(self, name, value=1, **tags):
+        span = self.current()
+        self.emit({"type": "count", "name": name, "value": value, "tags": tags,
+            "trace_id": span.trace_id if span else None,
+            "span_id": span.span_id if span else None})
+
+    def emit(self, event):
+        value = event["seconds"] if event["type"] == "span" else event["value"]
+        with self._lock:
+            totals = self._totals.setdefault(event["name"], {"count": 0, "total": 0})
+            totals["count"] += 1
+            totals["total"] += value
+        if self.callback is not None:
+            self.callback(event)
+
+    def summary(self):
+        """{name: {"count": events, "total": summed seconds or values}}"""
+        with self._lock:
+            return dict((k, dict(v)) for k, v in self._totals.items())
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+class _NullSpan(object):
+    trace_id = span_id = parent_id = None
+
+    def __init__(self):
+        self.tags = {}
+        self.start = time.time()
+
+class NullInstrumentation(object):
+    """The default: records nothing and costs next to nothing."""
+
+    def current(self):
+        return None
+
+    @contextmanager
+    def span(self, name, parent=None, trace_id=None, **tags):
+        yield _NullSpan()
+
+    def count(self, name, value=1, **tags):
+        pass
+
+    def summary(self):
+        return {}
+
+    def reset(self):
+        pass
@@ -0,0 +1,48 @@
+#! /usr/bin/env python
+#
+# Deferred imports for LittleBigQuery
+#
+import importlib
+import threading
+
+class LazyModule(object):
+    """
+    Stands in for a module until one of its attributes is first used,
+    so heavy dependencies like pandas are only imported by the calls
+    that need them.
+    >>> json = LazyModule("json")
+    >>> json.dumps([1])
+    '[1]'
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with LazyModule._lock:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self._name)
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        # probes like copy, pickle and doctest make (__wrapped__,
+        # __getstate__, ...) must not import the module
+        if attr.startswith("__") and attr.endswith("__"):
+            raise AttributeError(attr)
+        try:
+            module = self._load()
+        except ImportError as e:
+            # an optional dependency that isn't installed has no
+            # attributes, so hasattr() answers instead of raising
+            raise AttributeError("%s (%s)" % (attr, e))
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return "<lazy module %r>" % self._name
@@ -2,24 +2,245 @@
 #
 # LittleBigQuery, a sane python wrapper for BigQuery
 #
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from oauth2client.client import GoogleCredentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from googleapiclient import discovery
 from googleapiclient.http import MediaFileUpload
 from oauth2client.client import GoogleCredentials
+from multiprocessing.pool import ThreadPool
+from collections import OrderedDict
+from operator import itemgetter
+import httplib2
+import threading
 import uuid, time
-from datetime import datetime
+import random
+from datetime import date, datetime, timedelta
 import json
-import pandas as pd
+import logging
 import sys
+import glob, gzip, hashlib, numbers, os, re, shutil, socket, tempfile
+from .cache import table_key
+from .streaming import StreamWriter
+from .spool import FORMATS, SpoolWriter
+from .export import EXPORT_COMPRESSION, GCSStore, read_shard
+from .transport import HttpPool
+from .ratelimit import RateLimiter, is_throttled
+from .lazy import LazyModule
+from .instrumentation import NullInstrumentation
+
+# pandas and numpy take a large share of startup time, so they are only
+# imported once a call needs them
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+
+# the longest single getQueryResults wait when long polling
+LONG_POLL_SECONDS = 10
+
+# resumable upload chunk size; must be a multiple of 256KB
+UPLOAD_CHUNKSIZE = 8 * 1024 * 1024
+
+# gzip level for compressed uploads; level 1 keeps compression from
+# becoming the bottleneck on fast links
+GZIP_LEVEL = 1
+
+# the most calls the API client accepts in one batch request
+BATCH_LIMIT = 1000
+
+# per-job limits of load jobs: source URIs, and total bytes of sources
+MAX_LOAD_FILES = 10000
+MAX_LOAD_BYTES = 15 * 1024 ** 4
+
+# local file formats that can be concatenated into one upload
+_CONCATENABLE = ("CSV", "NEWLINE_DELIMITED_JSON")
+
+# queries whose row order matters; extract shards don't keep it
+_ORDER_BY = re.compile(r"\border\s+by\b", re.IGNORECASE)
+
+# where the BigQuery discovery document is kept between runs, and how
+# long a copy is trusted before it is fetched again
+DISCOVERY_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache",
+    "little_big_query")
+DISCOVERY_TTL = 7 * 24 * 3600
+
+logger = logging.getLogger("little_big_query")
+
+# numeric columns of Job.plan(), in the order they are shown
+_PLAN_COLUMNS = ["startMs", "endMs", "durationMs", "slotMs",
+    "recordsRead", "recordsWritten", "shuffleOutputBytes",
+    "parallelInputs", "completedParallelInputs",
+    "waitRatioAvg", "waitRatioMax", "readRatioAvg", "readRatioMax",
+    "computeRatioAvg", "computeRatioMax", "writeRatioAvg", "writeRatioMax"]
 
 class LittleBigQueryException(Exception):
     def __init__(self,*args,**kwargs):
         Exception.__init__(self,*args,**kwargs)
 
+def _setting(value):
+    """A configuration value as text, with the API's booleans and the
+    'true' strings this module sends for them made equal."""
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return u"%s" % value
+
+def _same_configuration(requested, existing):
+    """
+    True if existing, a job configuration as the API returns it (with
+    defaults filled in), holds every setting of requested.
+    >>> _same_configuration({"query": {"query": "SELECT 1", "allowLargeResults": 'true'}},
+    ...     {"query": {"query": "SELECT 1", "allowLargeResults": True, "useLegacySql": True}})
+    True
+    >>> _same_configuration({"query": {"query": "SELECT 1 LIMIT 7"}}, {"query": {"query": "SELECT 1 LIMIT 5"}})
+    False
+    """
+    if isinstance(requested, dict):
+        return isinstance(existing, dict) and all(_same_configuration(v, existing[k])
+            if k in existing else not v for k, v in requested.items())
+    if isinstance(requested, list):
+        return (isinstance(existing, list) and len(requested) == len(existing)
+            and all(_same_configuration(a, b) for a, b in zip(requested, existing)))
+    return _setting(requested) == _setting(existing)
+
+def _reattachable(job, request):
+    """
+    Whether job, found under the jobId of request, can stand in for it:
+    True if it is running or succeeded, False if it failed and request
+    has to run again.  Raises if job was submitted with another
+    configuration.
+    """
+    if not _same_configuration(request["configuration"], job.get("configuration", {})):
+        raise LittleBigQueryException("Job %s exists with a different configuration; "
+            "submit this one under another job_id." % request["jobReference"]["jobId"])
+    status = job.get("status", {})
+    return status.get("state") != "DONE" or "errorResult" not in status
+
+def _retry_id(job_id, attempt):
+    """The jobId a failed job_id is submitted again under."""
+    return "%s_retry%d" % (job_id, attempt)
+
+class Backoff(object):
+    """
+    Polling schedule for running jobs: exponential backoff with jitter,
+    capped at max_interval, giving up after timeout seconds (None waits
+    forever).
+
+    Attributes:
+        initial: the first delay, in seconds
+        multiplier: growth factor applied after every delay
+        max_interval: the longest delay between two checks
+        jitter: the fraction by which each delay is randomly stretched or shrunk
+        timeout: the overall time limit, in seconds
+    """
+
+    def __init__(self, initial=0.1, multiplier=1.6, max_interval=8.0,
+        jitter=0.2, timeout=None):
+        self.initial = initial
+        self.multiplier = multiplier
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.timeout = timeout
+
+    def delays(self):
+        delay = self.initial
+        while True:
+            yield delay * (1 + random.uniform(-self.jitter, self.jitter))
+            delay = min(delay * self.multiplier, self.max_interval)
+
+    def remaining(self, start):
+        if self.timeout is None:
+            return float("inf")
+        return self.timeout - (time.time() - start)
+
+class Job(object):
+    """
+    A handle on a submitted BigQuery job, returned by the submit_*
+    methods of LittleBigQuery.
+
+    Attributes:
+        resource: the latest job resource returned by the API
+        job_id: the BigQuery job ID
+    """
+
+    def __init__(self, bq, resource, finish=None):
+        self._bq = bq
+        self._finish = finish
+        self._result = None
+        self._finished = False
+        self.resource = resource
+
+    @property
+    def jobReference(self):
+        return self.resource['jobReference']
+
+    @property
+    def job_id(self):
+        return self.jobReference['jobId']
+
+    @property
+    def state(self):
+        return self.resource['status']['state']
+
+    def refresh(self):
+        """Re-reads the job resource from the API."""
+        self.resource = self._bq.bigquery_service.jobs().get(
+            projectId=self.jobReference.get('projectId', self._bq.project_id),
+            jobId=self.job_id).execute(num_retries=2)
+        return self.resource
+
+    def done(self):
+        """True once the job has finished, successfully or not."""
+        if self.state != 'DONE':
+            self.refresh()
+        return self.state == 'DONE'
+
+    def error(self):
+        """The job's errorResult, or None."""
+        return self.resource['status'].get('errorResult')
+
+    def plan(self):
+        """
+        The query plan of a finished query job as a data frame with one
+        row per stage: its name and status, when it ran, the slot time
+        it used, the records it read and wrote, and how its workers
+        split their time between waiting, reading, computing and
+        writing (as ratios of the slowest worker).  Sort by durationMs
+        or slotMs to find the slow stages.
+        """
+        stages = self.resource.get('statistics', {}).get('query', {}).get('queryPlan', [])
+        frame = pd.DataFrame([dict((k, v) for k, v in stage.items()
+            if not isinstance(v, (list, dict))) for stage in stages])
+        for c in ["id", "name", "status"] + _PLAN_COLUMNS:
+            if c not in frame.columns:
+                frame[c] = None
+        for c in _PLAN_COLUMNS:
+            frame[c] = pd.to_numeric(frame[c], errors="coerce")
+        frame["durationMs"] = frame["endMs"] - frame["startMs"]
+        return frame[["id", "name", "status"] + _PLAN_COLUMNS]
+
+    def wait(self, silent=False):
+        """Waits for the job and returns the finished job resource."""
+        if self.state == 'DONE':
+            if self.error():
+                raise RuntimeError(self.error())
+            return self.resource
+        self.resource = self._bq._poll_job(self.resource, silent)
+        return self.resource
+
+    def result(self, silent=False):
+        """
+        Waits for the job and returns its result: the data frame for
+        queries, the finished job resource for everything else.
+        Raises RuntimeError if the job failed.
+        """
+        if not self._finished:
+            self.wait(silent)
+            if self._finish:
+                self._result = self._finish(self)
+            else:
+                self._result = self.resource
+            self._finished = True
+        return self._result
+
 class LittleBigQuery(object):
     """
     The LittleBigQuery class.  This is the primary class for the wrapper.
@@ -28,39 +249,295 @@ class LittleBigQuery(object):
         projectId: the current projectId
         credentials: the GoogleCredentials for this session
         bigquery_service: the authenticated BQ v2 API tokens
+        fetch_workers: the number of threads used to fetch result pages
+        page_size: rows requested per result page (None lets BigQuery decide)
+        backoff: the Backoff schedule used while waiting for jobs
+        long_poll: wait for query jobs inside getQueryResults instead of sleeping
+        cache: an optional ResultCache for query() results
+        catalog: an optional MetadataCache for desc, showTables, showDatasets and showPartitions
+        discovery_cache: the directory caching the discovery document (None disables it)
+        pool_size: the most HTTP connections open at once, and so the
+            most API calls in flight
+        rate_limiter: the RateLimiter every API call waits for (see
+            HttpPool); share one between clients that share a quota
+        priority: the priority query jobs run at unless a call says
+            otherwise: "INTERACTIVE" or "BATCH" (queued until BigQuery
+            has idle capacity, and not counted against the concurrent
+            query limit)
+        http: the HttpPool every request goes through
+        instrumentation: an Instrumentation receiving timings and counters
+        progress: where job progress messages go: "print", "log" (the
+            little_big_query logger) or None
+        export_uri: a gs:// directory extract jobs may write temporary
+            shards to; needed for extract() and query(via_export=True)
+        export_rows, export_bytes: query() reads results with at least
+            this many rows or bytes through an extract job (None: never).
+            Extract shards don't keep row order, so queries with an
+            ORDER BY are always paged instead
+        export_store: where shards are listed and downloaded from: a
+            GCSStore (the default) or a LocalStore
+        idempotent_jobs: with a run_key, derive the ID of every job
+            from its configuration, so that submitting the same job
+            twice (say, from a worker restarted after a crash)
+            reattaches to the first one instead of running it again
+        run_key: with idempotent_jobs, names one run of a workload (say,
+            the day a nightly batch processes): a worker restarted with
+            the same run_key reattaches to the jobs it submitted before,
+            one with a new run_key runs them again
+
+    The credentials and the service are created on first use, so
+    constructing a LittleBigQuery costs nothing until it is called.
+    One instance can be shared by many threads: each request borrows a
+    transport from http for its duration.
     """
-    
-    def __init__(self, projectId, dataset=None):
-        self.credentials = GoogleCredentials.get_application_default()
-        self.bigquery_service = build('bigquery', 'v2', credentials=self.credentials)
+
+    _credentials = None
+    _service = None
+    _http = None
+    _init_lock = threading.Lock()
+    instrumentation = NullInstrumentation()
+    progress = "print"
+    export_uri = None
+    export_rows = None
+    export_bytes = None
+    _export_store = None
+    idempotent_jobs = False
+    run_key = None
+    _job_counts = None
+    rate_limiter = None
+    priority = "INTERACTIVE"
+
+    def __init__(self, projectId, dataset=None, fetch_workers=8, page_size=None,
+        backoff=None, long_poll=False, cache=None,
+        catalog=None, discovery_cache=DISCOVERY_CACHE_DIR, pool_size=16,
+        instrumentation=None, progress="print", export_uri=None,
+        export_rows=None, export_bytes=None, export_store=None, idempotent_jobs=False,
+        rate_limiter=None, priority="INTERACTIVE", run_key=None):
+        if instrumentation is not None:
+            self.instrumentation = instrumentation
+        self.progress = progress
+        self.discovery_cache = discovery_cache
+        self.pool_size = pool_size
         self.project_id = projectId
         self.dataset = dataset
-        
+        self.fetch_workers = fetch_workers
+        self.page_size = page_size
+        self.backoff = backoff or Backoff()
+        self.long_poll = long_poll
+        self.cache = cache
+        self.catalog = catalog
+        self.export_uri = export_uri
+        self.export_rows = export_rows
+        self.export_bytes = export_bytes
+        if export_store is not None:
+            self._export_store = export_store
+        self.idempotent_jobs = idempotent_jobs
+        self.run_key = run_key
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.priority = priority
+
+    @property
+    def credentials(self):
+        if self._credentials is None:
+            with self._init_lock:
+                if self._credentials is None:
+                    self._credentials = GoogleCredentials.get_application_default()
+        return self._credentials
+
+    @credentials.setter
+    def credentials(self, credentials):
+        self._credentials = credentials
+
+    @property
+    def http(self):
+        if self._http is None:
+            credentials = self.credentials
+            with self._init_lock:
+                if self._http is None:
+                    self._http = HttpPool(credentials, self.pool_size,
+                        instrumentation=self.instrumentation, limiter=self.rate_limiter)
+        return self._http
+
+    @property
+    def export_store(self):
+        if self._export_store is None:
+            self._export_store = GCSStore(self.http)
+        return self._export_store
+
+    @export_store.setter
+    def export_store(self, store):
+        self._export_store = store
+
+    @property
+    def bigquery_service(self):
+        if self._service is None:
+            http = self.http
+            with self._init_lock:
+                if self._service is None:
+                    self._service = discovery.build_from_document(
+                        self._discovery_document(), http=http)
+        return self._service
+
+    @bigquery_service.setter
+    def bigquery_service(self, service):
+        self._service = service
+
+    def _discovery_document(self):
+        """
+        Returns the BigQuery v2 discovery document without a network
+        round trip where possible: from the copy bundled with newer API
+        clients, else from discovery_cache, else fetched and saved there.
+        A stale cached copy is still used if the fetch fails.
+        """
+        try:
+            from googleapiclient.discovery_cache import get_static_doc
+            document = get_static_doc("bigquery", "v2")
+            if document:
+                return document
+        except ImportError:
+            pass
+
+        path = None
+        document = None
+        if self.discovery_cache:
+            path = os.path.join(self.discovery_cache, "bigquery.v2.json")
+            try:
+                with open(path, "rb") as f:
+                    document = f.read().decode("utf-8")
+                if time.time() - os.path.getmtime(path) < DISCOVERY_TTL:
+                    return document
+            except (IOError, OSError):
+                pass
+
+        uri = discovery.DISCOVERY_URI.format(api="bigquery", apiVersion="v2")
+        try:
+            resp, content = httplib2.Http().request(uri)
+            if resp.status != 200:
+                raise HttpError(resp, content, uri=uri)
+        except (HttpError, httplib2.HttpLib2Error, socket.error):
+            if document is not None:
+                return document
+            raise
+        document = content.decode("utf-8")
+        json.loads(document)
+
+        if path is not None:
+            try:
+                if not os.path.isdir(self.discovery_cache):
+                    os.makedirs(self.discovery_cache)
+                #write then rename, so readers never see half a file
+                fd, tmp = tempfile.mkstemp(dir=self.discovery_cache)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(content)
+                os.rename(tmp, path)
+            except (IOError, OSError):
+                pass
+        return document
+
+    def _report(self, message):
+        if self.progress == "print":
+            print(message)
+        elif self.progress == "log":
+            logger.info(message)
+
     def _poll_job(self, job, silent=False):
         """Waits for a job to complete.  Adapted from the 
-        Google BigQuery Samples
+        Google BigQuery Samples.  The first status check is immediate;
+        after that the wait follows self.backoff.  With long_poll set,
+        query jobs wait inside getQueryResults(timeoutMs=...) instead of
+        sleeping, so BigQuery answers as soon as the job finishes.
+        Returns the finished job resource.
         """
 
         if not silent:
-            print('Waiting for job to finish...')
+            self._report('Waiting for job to finish...')
 
-        request = self.bigquery_service.jobs().get(
-            projectId=self.project_id,
-            jobId=job['jobReference']['jobId'])
+        jobs = self.bigquery_service.jobs()
+        jobReference = job['jobReference']
+        request = jobs.get(
+            projectId=jobReference.get('projectId', self.project_id),
+            jobId=jobReference['jobId'])
+        is_query = 'query' in job.get('configuration', {})
+        delays = self.backoff.delays()
+        start = time.time()
 
-        while True:
-            result = request.execute(num_retries=2)
+        with self.instrumentation.span("job.poll", job_id=jobReference['jobId']) as span:
+            span.tags["polls"] = 0
+            while True:
+                result = request.execute(num_retries=2)
+                span.tags["polls"] += 1
+                self.instrumentation.count("job.polls")
 
-            if result['status']['state'] == 'DONE':
-                if 'errorResult' in result['status']:
-                    raise RuntimeError(result['status']['errorResult'])
-                if not silent:
-                    print('Job complete.')
-                return True
+                if result['status']['state'] == 'DONE':
+                    if 'errorResult' in result['status']:
+                        raise RuntimeError(result['status']['errorResult'])
+                    break
 
-            time.sleep(1)
-        return False
+                remaining = self.backoff.remaining(start)
+                if remaining <= 0:
+                    raise LittleBigQueryException("Timed out waiting for job %s"
+                        % jobReference['jobId'])
+
+                if self.long_poll and is_query:
+                    try:
+                        jobs.getQueryResults(
+                            projectId=jobReference.get('projectId', self.project_id),
+                            jobId=jobReference['jobId'],
+                            timeoutMs=int(min(remaining, LONG_POLL_SECONDS) * 1000),
+                            maxResults=0).execute(num_retries=2)
+                    except HttpError:
+                        # failed jobs error out here and jobs.get reports
+                        # why; back off so a persistent error can't spin
+                        time.sleep(min(next(delays), remaining))
+                else:
+                    time.sleep(min(next(delays), remaining))
+
+        if not silent:
+            self._report('Job complete.')
+        return result
     
+    def as_completed(self, jobs, timeout=None):
+        """
+        Yields each Job in jobs as it finishes.  All pending jobs are
+        checked in one sweep, their statuses read with batch requests
+        (see _batch), and sweeps are spaced out by self.backoff.
+        Raises LittleBigQueryException if timeout seconds pass first.
+        """
+        pending = list(jobs)
+        delays = self.backoff.delays()
+        start = time.time()
+        while pending:
+            running = [job for job in pending if job.state != 'DONE']
+            statuses = self._batch([(i, self.bigquery_service.jobs().get(
+                projectId=job.jobReference.get('projectId', self.project_id),
+                jobId=job.job_id)) for i, job in enumerate(running)])
+            for job, (resource, error) in zip(running, statuses.values()):
+                if error is not None:
+                    raise error
+                job.resource = resource
+            still_running = []
+            for job in pending:
+                if job.state == 'DONE':
+                    yield job
+                else:
+                    still_running.append(job)
+            pending = still_running
+            if pending:
+                if timeout is not None and time.time() - start > timeout:
+                    raise LittleBigQueryException("Timed out waiting for %d jobs"
+                        % len(pending))
+                time.sleep(next(delays))
+
+    def wait_all(self, jobs, timeout=None):
+        """
+        Waits for every Job in jobs and returns their results in the
+        same order.  Raises RuntimeError for the first failed job.
+        """
+        jobs = list(jobs)
+        for job in self.as_completed(jobs, timeout):
+            pass
+        return [job.result(silent=True) for job in jobs]
+
     def _parse_schema(self, s):
         names_and_types = map(lambda x: (x["name"], x["type"]), 
             s["fields"])
@@ -80,7 +557,7 @@ class LittleBigQuery(object):
         return mappings
         
     def _apply_schema(self, r, s):
-        raw_data = map(lambda x: map(lambda y: y["v"], x["f"]), r)
+        raw_data = [[y["v"] for y in x["f"]] for x in r]
 
         def _encode(this_row, sch):
             new_row = []
@@ -89,9 +566,165 @@ class LittleBigQuery(object):
                 new_row.append(sch[i][1](this_row[i]))
             return new_row
         
-        return map(lambda x: _encode(x, s), raw_data)
-        
-    def query(self, q, raw=False, sync=False, projectId=None):
+        return [_encode(x, s) for x in raw_data]
+
+    def _decode_column(self, values, fieldType):
+        """Converts one column of raw "v" values in a single vectorized
+        step.  NULLs become <NA> (INTEGER, BOOLEAN), NaN (FLOAT) or NaT
+        (TIMESTAMP).
+        """
+        s = pd.Series(values, dtype=object)
+        nulls = s.isnull().values
+        has_nulls = nulls.any()
+
+        if fieldType == "INTEGER":
+            ints = s.where(~nulls, "0").values.astype(np.int64)
+            col = pd.Series(ints).astype("Int64")
+            if has_nulls:
+                col[nulls] = np.nan
+            return col
+        if fieldType == "FLOAT":
+            return pd.Series(s.where(~nulls, "nan").values.astype(np.float64))
+        if fieldType == "BOOLEAN":
+            bools = pd.Series(s.where(~nulls, "").str.upper().values == "TRUE")
+            # always nullable, so every chunk of a column has one dtype;
+            # pandas grew a "boolean" dtype in 1.0, older versions fall
+            # back to object columns holding True/False/None
+            if hasattr(pd, "BooleanDtype"):
+                bools = bools.astype("boolean")
+            else:
+                bools = bools.astype(object)
+            if has_nulls:
+                bools[nulls] = None
+            return bools
+        if fieldType == "TIMESTAMP":
+            seconds = s.where(~nulls, "nan").values.astype(np.float64)
+            # BigQuery timestamps carry microsecond precision
+            micros = np.round(seconds * 1e6)
+            return pd.Series(pd.to_datetime(micros, unit="us", utc=True)
+                ).astype("datetime64[ns, UTC]")
+        if fieldType == "RECORD":
+            return s.map(json.dumps)
+        return s
+
+    def _decode_frame(self, rows, schema):
+        """Column-oriented replacement for _parse_schema/_apply_schema.
+        Transposes the f/v payload into per-column arrays and converts
+        each column with _decode_column.
+        """
+        fields = schema["fields"]
+        names = [f["name"] for f in fields]
+        with self.instrumentation.span("decode.columns", rows=len(rows)):
+            cells = list(map(itemgetter("f"), rows))
+            get_v = itemgetter("v")
+            columns = []
+            for i, f in enumerate(fields):
+                values = list(map(get_v, map(itemgetter(i), cells)))
+                columns.append(self._decode_column(values, f["type"]))
+        if not columns:
+            return pd.DataFrame()
+        with self.instrumentation.span("decode.frame", rows=len(rows)):
+            # concat keeps each column's dtype without the per-value boxing
+            # DataFrame(dict) does for tz-aware columns
+            return pd.concat(columns, axis=1, keys=names)
+
+    def _decode_export_column(self, values, fieldType):
+        """Like _decode_column, for the typed values of extract shards:
+        JSON numbers and booleans, "YYYY-MM-DD HH:MM:SS[.ffffff] UTC"
+        timestamps in JSON and microseconds or datetimes in Avro.
+        """
+        if fieldType == "TIMESTAMP":
+            sample = next((v for v in values if v is not None), None)
+            if isinstance(sample, datetime):
+                col = pd.to_datetime(pd.Series(values, dtype=object), utc=True)
+            else:
+                if not isinstance(sample, numbers.Integral):
+                    values = np.array([v[:-4] if v is not None and v.endswith(" UTC")
+                        else v or "NaT" for v in values], dtype="datetime64[us]")
+                else:
+                    values = np.array([v if v is not None else np.iinfo(np.int64).min
+                        for v in values], dtype="datetime64[us]")
+                col = pd.to_datetime(values.astype(np.int64), unit="us", utc=True)
+            return pd.Series(col).astype("datetime64[ns, UTC]")
+        if fieldType in ("INTEGER", "FLOAT", "BOOLEAN"):
+            values = [None if v is None else ("true" if v else "false")
+                if isinstance(v, bool) else str(v) for v in values]
+        return self._decode_column(values, fieldType)
+
+    def _get_query_results(self, jobReference, **kwargs):
+        """Fetches one page of query results, page_size rows at a time
+        unless maxResults is given.
+        """
+        if self.page_size and "maxResults" not in kwargs:
+            kwargs["maxResults"] = self.page_size
+        return self.bigquery_service.jobs().getQueryResults(
+            projectId=jobReference['projectId'],
+            jobId=jobReference['jobId'],
+            **kwargs).execute(num_retries=5)
+
+    def _fetch_range(self, jobReference, start, count, parent=None):
+        """Fetches rows [start, start + count) of a finished query.
+        BigQuery may return fewer rows than asked for when a page hits
+        its byte limit, so keep asking until the range is filled.
+        """
+        rows = []
+        with self.instrumentation.span("results.fetch_range", parent=parent,
+            start=start, rows=count):
+            while len(rows) < count:
+                page = self._get_query_results(jobReference,
+                    startIndex=start + len(rows),
+                    maxResults=count - len(rows))
+                page_rows = page.get("rows", [])
+                if not page_rows:
+                    break
+                rows.extend(page_rows)
+        return rows
+
+    def _page_ranges(self, start, total, page_size):
+        """Splits the rows [start, total) into (startIndex, maxResults)
+        pairs of at most page_size rows.
+        """
+        return [(i, min(page_size, total - i))
+            for i in range(start, total, page_size)]
+
+    def _fetch_results(self, jobReference):
+        """Fetches every row of a finished query.  The first page tells
+        us totalRows; the remainder is split into startIndex/maxResults
+        ranges which are fetched concurrently and stitched back together
+        in order.  Returns the first response with "rows" holding the
+        full result.
+        """
+        with self.instrumentation.span("results.fetch") as span:
+            first = self._get_query_results(jobReference)
+            rows = first.get("rows", [])
+            total = int(first.get("totalRows", len(rows)))
+
+            if len(rows) < total:
+                page_size = self.page_size or len(rows) or total
+                ranges = self._page_ranges(len(rows), total, page_size)
+                pool = ThreadPool(max(1, min(self.fetch_workers, len(ranges))))
+                try:
+                    # worker threads don't see this thread's open spans
+                    pages = pool.map(
+                        lambda r: self._fetch_range(jobReference, r[0], r[1], span),
+                        ranges)
+                finally:
+                    pool.close()
+                    pool.join()
+                for p in pages:
+                    rows.extend(p)
+
+            span.tags["rows"] = len(rows)
+            span.tags["rows_per_second"] = len(rows) / max(time.time() - span.start, 1e-6)
+        self.instrumentation.count("rows_fetched", len(rows))
+
+        first["rows"] = rows
+        first.pop("pageToken", None)
+        return first
+
+    def query(self, q, raw=False, sync=False, projectId=None, use_cache=True,
+        cache_ttl=None, dry_run=False, maximumBytesBilled=None, via_export=None,
+        job_id=None, priority=None):
         """
         Default query method.  Takes a query and submits it to
         the BigQuery web service.  By default, uses the 
@@ -102,21 +735,342 @@ class LittleBigQuery(object):
             q: the query
             raw: Returns the raw result
             sync: Async (default) or sync operation
+            use_cache: set to False to bypass the result cache
+            cache_ttl: seconds to keep this result cached (default: the cache's ttl)
+            dry_run: return estimate(q) instead of running the query
+            maximumBytesBilled: fail the query instead of billing more bytes than this
+            via_export: read the result through an extract job to export_uri
+                (True), by paging (False), or by whichever export_rows and
+                export_bytes pick (None); an export loses the order of an
+                ORDER BY, so None never picks it for one
+            job_id: the ID to run the job under; if a job with this ID
+                exists already, its result is returned instead (see
+                _insert_job)
+            priority: "INTERACTIVE" or "BATCH" (default: self.priority)
         >>> BQ.query("SELECT COUNT(*) as trip_count FROM [nyc-tlc:yellow.trips];")
         Waiting for job to finish...
         Job complete.
            trip_count
         0  1108779463
         """
-        # get a new job ID
-        job_id = str(uuid.uuid4())
-        
+        if dry_run:
+            return self.estimate(q)
+        with self.instrumentation.span("query"):
+            if self.cache is None or raw or not use_cache:
+                return self.submit_query(q, raw, maximumBytesBilled, via_export,
+                    job_id, priority).result()
+
+            key = self.cache.key(q, self.project_id, self.dataset)
+            frame = self.cache.get(key)
+            self.instrumentation.count("cache.hit" if frame is not None else "cache.miss")
+            if frame is None:
+                job = self.submit_query(q, maximumBytesBilled=maximumBytesBilled,
+                    via_export=via_export, job_id=job_id, priority=priority)
+                frame = job.result()
+                self.cache.put(key, frame, self._referenced_tables(job.resource),
+                    cache_ttl)
+            return frame
+
+    def _referenced_tables(self, job):
+        """The tables a finished query job read, as cache table keys."""
+        tables = job.get('statistics', {}).get('query', {}).get('referencedTables', [])
+        return [table_key(t['projectId'], t['datasetId'], t['tableId'])
+            for t in tables]
+
+    def _invalidate(self, tableName, datasetId=None):
+        """Drops cached results and metadata for tableName."""
+        if self.cache is not None:
+            self.cache.invalidate(table_key(self.project_id,
+                datasetId or self.dataset, tableName))
+        if self.catalog is not None:
+            self.catalog.invalidate_table(self.project_id,
+                datasetId or self.dataset, tableName)
+
+    def _invalidate_dataset(self, datasetId):
+        if self.catalog is not None:
+            self.catalog.invalidate_dataset(self.project_id, datasetId)
+
+    def _write_job(self, job, tableName, datasetId=None):
+        """Wraps a job that writes to tableName so that cached results
+        reading from it are dropped both now and once it finishes.
+        """
+        self._invalidate(tableName, datasetId)
+        def finish(j):
+            self._invalidate(tableName, datasetId)
+            return j.resource
+        return Job(self, job, finish)
+
+    def submit_query(self, q, raw=False, maximumBytesBilled=None, via_export=None,
+        job_id=None, priority=None):
+        """
+        Like query, but returns a Job as soon as the job is inserted
+        instead of waiting for it.  Job.result() returns the data frame
+        (or the raw result), and Job.plan() the query plan.
+        """
+        return Job(self, self._insert_query_job(q, maximumBytesBilled=maximumBytesBilled,
+            job_id=job_id, priority=priority), self._query_finish(raw, via_export))
+
+    def _query_finish(self, raw=False, via_export=None):
+        """The finish function of a query Job: fetches and decodes the
+        result of the finished job."""
+        def finish(job):
+            table = None if raw else self._export_table(job, via_export)
+            if table is not None:
+                return self._extract_table(table)
+            raw_results = self._fetch_results(job.jobReference)
+            if raw:
+                return raw_results
+            rows = raw_results["rows"]
+            with self.instrumentation.span("decode", rows=len(rows)):
+                return self._decode_frame(rows, raw_results["schema"])
+        return finish
+
+    def attach(self, job_id, projectId=None, raw=False):
+        """
+        Returns a Job for a job inserted earlier, running or finished,
+        without running it again: Job.result() waits for it and returns
+        what the submit_* method that inserted it would have (the data
+        frame, or the raw result, of a query; the job resource of jobs
+        that write a table).  Lets a worker that lost track of a job,
+        say after a crash, pick it up where it was.
+        """
+        resource = self.bigquery_service.jobs().get(projectId=projectId or self.project_id,
+            jobId=job_id).execute(num_retries=2)
+        configuration = resource.get('configuration', {})
+        for kind in ('query', 'load', 'copy'):
+            table = configuration.get(kind, {}).get('destinationTable')
+            # query results land in hidden datasets, named with a leading _
+            if table and not table['datasetId'].startswith('_'):
+                return self._write_job(resource, table['tableId'], table['datasetId'])
+        if 'query' in configuration:
+            return Job(self, resource, self._query_finish(raw))
+        return Job(self, resource)
+
+    def estimate(self, q):
+        """
+        Dry-runs a query: BigQuery validates and plans it, but neither
+        runs nor bills it.  Returns a dict with
+            totalBytesProcessed: the bytes a real run would scan (and bill)
+            cacheHit: whether a real run would be answered from cache
+            referencedTables: the tables the query reads
+            schema: the fields of the result
+        >>> BQ.estimate("SELECT COUNT(*) as trip_count FROM [nyc-tlc:yellow.trips];")["totalBytesProcessed"]
+        0
+        """
+        return self._summarize_dry_run(self._insert_query_job(q, dryRun=True))
+
+    def _summarize_dry_run(self, job):
+        statistics = job.get('statistics', {})
+        query = statistics.get('query', {})
+        return {
+            "totalBytesProcessed": int(query.get('totalBytesProcessed',
+                statistics.get('totalBytesProcessed', 0))),
+            "cacheHit": query.get('cacheHit', False),
+            "referencedTables": query.get('referencedTables', []),
+            "schema": query.get('schema', {}).get('fields', [])
+        }
+
+    def query_chunks(self, q, chunk_rows=100000, maximumBytesBilled=None):
+        """
+        Runs a query and yields the result as a sequence of pandas
+        data frames of at most chunk_rows rows each, so the full result
+        never has to fit in memory.  The next chunk is fetched in the
+        background while the caller works on the current one.
+
+        Arguments:
+            q: the query
+            chunk_rows: the maximum number of rows per data frame
+            maximumBytesBilled: fail the query instead of billing more bytes than this
+        >>> for chunk in BQ.query_chunks("SELECT passenger_count FROM [nyc-tlc:yellow.trips] LIMIT 25000", chunk_rows=10000):
+        ...     print(len(chunk))
+        Waiting for job to finish...
+        Job complete.
+        10000
+        10000
+        5000
+        """
+        for rows, schema in self._row_chunks(q, chunk_rows, maximumBytesBilled):
+            yield self._decode_frame(rows, schema)
+
+    def _row_chunks(self, q, chunk_rows, maximumBytesBilled=None):
+        """Runs a query and yields (rows, schema) for every chunk_rows rows
+        of the result, fetching the next chunk while the current one is
+        being worked on.
+        """
+        jobReference = self.submit_query(q,
+            maximumBytesBilled=maximumBytesBilled).wait()['jobReference']
+        first = self._get_query_results(jobReference, maxResults=chunk_rows)
+        schema = first["schema"]
+        rows = first.get("rows", [])
+        total = int(first.get("totalRows", len(rows)))
+        ranges = self._page_ranges(len(rows), total, chunk_rows)
+        del first
+
+        # a single worker keeps exactly one chunk in flight
+        pool = ThreadPool(1)
+        try:
+            pending = None
+            if ranges:
+                pending = pool.apply_async(self._fetch_range,
+                    (jobReference,) + ranges[0])
+            yield rows, schema
+            for i in range(len(ranges)):
+                rows = pending.get()
+                if i + 1 < len(ranges):
+                    pending = pool.apply_async(self._fetch_range,
+                        (jobReference,) + ranges[i + 1])
+                yield rows, schema
+        finally:
+            pool.terminate()
+
+    def query_to_file(self, q, path, format="parquet", chunk_rows=100000,
+        compression=None, maximumBytesBilled=None):
+        """
+        Runs a query and writes the result to a Parquet or Feather
+        (format="feather") file at path, chunk_rows rows at a time, so
+        memory use is bounded by about two chunks however large the
+        result is.  Needs pyarrow.  Returns the number of rows written;
+        open_spool(path) reopens the file memory-mapped.
+
+        Arguments:
+            q: the query
+            path: the file to write; it only appears once it is complete
+            format: "parquet" (compact) or "feather" (zero-copy reads)
+            chunk_rows: the rows fetched, decoded and written at a time
+            compression: the codec to use (default: snappy for Parquet,
+                none for Feather)
+            maximumBytesBilled: fail the query instead of billing more bytes than this
+        >>> BQ.query_to_file("SELECT passenger_count FROM [nyc-tlc:yellow.trips] LIMIT 25000", "/tmp/trips.parquet", chunk_rows=10000)
+        Waiting for job to finish...
+        Job complete.
+        25000
+        >>> open_spool("/tmp/trips.parquet").num_rows
+        25000
+        """
+        if format not in FORMATS:
+            raise LittleBigQueryException("Unknown file format: %s" % format)
+        with self.instrumentation.span("query_to_file", format=format) as span:
+            writer = None
+            try:
+                for rows, schema in self._row_chunks(q, chunk_rows, maximumBytesBilled):
+                    if writer is None:
+                        writer = SpoolWriter(path, schema["fields"], format, compression)
+                    frame = self._decode_frame(rows, schema)
+                    with self.instrumentation.span("spool.write", rows=len(frame)):
+                        writer.write(frame)
+            except Exception:
+                if writer is not None:
+                    writer.abort()
+                raise
+            writer.close()
+            span.tags["rows"] = writer.rows
+        return writer.rows
+
+    def read_table(self, tableName, columns=None, partition=None, max_rows=None,
+        datasetId=None):
+        """
+        Reads a table, or one of its partitions, straight from storage
+        with tabledata.list: no query job is run and no bytes are billed.
+        Only the columns asked for are transferred.  After the first page
+        tells us the row count, the rest is fetched as startIndex ranges,
+        fetch_workers at a time, and decoded like a query() result.
+
+        Arguments:
+            tableName: the table to read
+            columns: the columns to read, in this order (default: all)
+            partition: a partition to read instead, e.g. "20160301"
+            max_rows: read at most this many rows
+        >>> BQ.createTableFromLocalCSV("my_read_table", [("id", "INTEGER"), ("email", "STRING"), ("amount", "FLOAT"), ("event_time", "TIMESTAMP")], "examples/MOCK_DATA.csv", "little_big_query_test")
+        Waiting for job to finish...
+        Job complete.
+        >>> BQ.read_table("my_read_table", columns=["email", "id"], datasetId="little_big_query_test").shape
+        (10, 2)
+        >>> BQ.dropTable("my_read_table", "little_big_query_test")
+        """
+        if not datasetId:
+            if not self.dataset:
+                raise LittleBigQueryException("No datasetId specified.")
+            else:
+                datasetId = self.dataset
+        fields = self.desc(tableName.split("$")[0], datasetId)
+        if columns is not None:
+            unknown = set(columns) - set(f["name"] for f in fields)
+            if unknown:
+                raise LittleBigQueryException("Unknown columns: %s"
+                    % ", ".join(sorted(unknown)))
+            # rows come back in the order of the table's schema
+            fields = [f for f in fields if f["name"] in columns]
+        tableId = "%s$%s" % (tableName, partition) if partition else tableName
+        selected = ",".join(f["name"] for f in fields) if columns is not None else None
+
+        with self.instrumentation.span("read_table", table=tableId) as span:
+            first_page = max_rows
+            if max_rows is not None and self.page_size:
+                first_page = min(max_rows, self.page_size)
+            first = self._list_table_data(datasetId, tableId, selected, 0, first_page)
+            rows = first.get("rows", [])
+            total = int(first.get("totalRows", len(rows)))
+            if max_rows is not None:
+                total = min(total, max_rows)
+                del rows[total:]
+
+            if len(rows) < total:
+                page_size = self.page_size or len(rows) or total
+                ranges = self._page_ranges(len(rows), total, page_size)
+                pool = ThreadPool(max(1, min(self.fetch_workers, len(ranges))))
+                try:
+                    pages = pool.map(lambda r: self._fetch_table_range(datasetId,
+                        tableId, selected, r[0], r[1], span), ranges)
+                finally:
+                    pool.close()
+                    pool.join()
+                for p in pages:
+                    rows.extend(p)
+            span.tags["rows"] = len(rows)
+        self.instrumentation.count("rows_fetched", len(rows))
+
+        with self.instrumentation.span("decode", rows=len(rows)):
+            frame = self._decode_frame(rows, {"fields": fields})
+        if columns is not None and len(columns):
+            frame = frame[list(columns)]
+        return frame
+
+    def _list_table_data(self, datasetId, tableId, selectedFields, startIndex,
+        maxResults=None):
+        """Fetches one page of tabledata.list, page_size rows at a time
+        unless maxResults is given."""
+        kwargs = {}
+        if selectedFields is not None:
+            kwargs["selectedFields"] = selectedFields
+        if maxResults is None:
+            maxResults = self.page_size
+        if maxResults is not None:
+            kwargs["maxResults"] = maxResults
+        return self.bigquery_service.tabledata().list(projectId=self.project_id,
+            datasetId=datasetId, tableId=tableId, startIndex=startIndex,
+            **kwargs).execute(num_retries=5)
+
+    def _fetch_table_range(self, datasetId, tableId, selectedFields, start, count,
+        parent=None):
+        """Like _fetch_range, for rows [start, start + count) of a table."""
+        rows = []
+        with self.instrumentation.span("read_table.fetch_range", parent=parent,
+            start=start, rows=count):
+            while len(rows) < count:
+                page = self._list_table_data(datasetId, tableId, selectedFields,
+                    start + len(rows), count - len(rows))
+                page_rows = page.get("rows", [])
+                if not page_rows:
+                    break
+                rows.extend(page_rows)
+        return rows
+
+    def _insert_query_job(self, q, dryRun=False, maximumBytesBilled=None, job_id=None,
+        priority=None):
+        """Inserts a query job and returns the job resource.
+        """
         # structure the request
         request = {
-            "jobReference" : {
-                "projectId" : self.project_id,
-                "job_id" : job_id
-            },
             "configuration" : {
                 "query" :{
                     "query" : q,
@@ -124,42 +1078,138 @@ class LittleBigQuery(object):
                         "projectId" : self.project_id,
                         "datasetId" : self.dataset
                     },
-                    "priority" : 'INTERACTIVE'                    }
+                    "priority" : priority or self.priority
+                    }
             }
         }
+        if dryRun:
+            request["configuration"]["dryRun"] = True
+        if maximumBytesBilled is not None:
+            request["configuration"]["query"]["maximumBytesBilled"] = str(int(maximumBytesBilled))
 
-        this_job = self.bigquery_service.jobs().insert(
-            projectId=self.project_id,
-            body=request).execute(num_retries=5)
+        return self._insert_job(request, job_id, dry_run=dryRun)
 
-        ready = self._poll_job(this_job)
-        if ready:
-            raw_results = self.bigquery_service.jobs().getQueryResults(
-                projectId=this_job['jobReference']['projectId'], 
-                jobId=this_job['jobReference']['jobId']).execute()
-            if raw:
-                return raw_results
-            rows = raw_results["rows"]
-            schema = self._parse_schema(raw_results["schema"])
-            frame = pd.DataFrame(self._apply_schema(rows, schema))
-            frame.columns = map(lambda x: x[0], schema)
-            return frame
+    def _job_reference(self, configuration=None, job_id=None):
+        """
+        The jobReference of a new job: job_id if given; with
+        idempotent_jobs and a run_key, a hash of the job's configuration,
+        run_key and the number of times this client submitted the same
+        job before, so that a rerun of the same workload gets the same
+        IDs; otherwise a random ID.  Running the same query or writing
+        the same rows again later isn't the same job again.
+        >>> BQ._job_reference(job_id="nightly_20160301")["jobId"]
+        'nightly_20160301'
+        >>> read = {"query": {"query": "SELECT 1"}}
+        >>> plain = LittleBigQuery(BQ.project_id, idempotent_jobs=True)
+        >>> plain._job_reference(read) == plain._job_reference(read)
+        False
+        >>> def rerun():
+        ...     return LittleBigQuery(BQ.project_id, idempotent_jobs=True,
+        ...         run_key="20160301")._job_reference(read)
+        >>> rerun() == rerun()
+        True
+        """
+        if job_id is None:
+            key = None
+            if self.idempotent_jobs and configuration is not None:
+                key = self._run_key([self.project_id, configuration])
+            if key is not None:
+                digest = hashlib.sha256(json.dumps(key,
+                    sort_keys=True).encode("utf-8")).hexdigest()
+                job_id = "lbq_" + digest[:40]
+            else:
+                job_id = str(uuid.uuid4())
+        return {"projectId" : self.project_id, "jobId" : job_id}
+
+    def _run_key(self, key):
+        """key with run_key and the number of jobs this client gave the
+        same key before added, or None without a run_key."""
+        if self.run_key is None:
+            return None
+        key = json.dumps(key + [self.run_key], sort_keys=True)
+        with self._init_lock:
+            if self._job_counts is None:
+                self._job_counts = {}
+            n = self._job_counts.get(key, 0)
+            self._job_counts[key] = n + 1
+        return [key, n]
+
+    def _insert_job(self, request, job_id=None, **tags):
+        """Inserts the job request describes, under the jobId
+        _job_reference gives it, and returns the job resource.  If a job
+        with that ID exists already (an insert retried after its response
+        was lost, or a job submitted again after a crash), that job is
+        returned instead of an error, to be polled rather than rerun.
+        It has to have the same configuration, or LittleBigQueryException
+        is raised; if it failed, request is submitted again under the ID
+        with _retry1 (then _retry2, ...) appended.
+        """
+        request["jobReference"] = self._job_reference(request["configuration"], job_id)
+        job_id = request["jobReference"]["jobId"]
+        attempt = 0
+        while True:
+            with self.instrumentation.span("job.insert",
+                job_id=request["jobReference"]["jobId"], **tags):
+                try:
+                    return self.bigquery_service.jobs().insert(
+                        projectId=self.project_id,
+                        body=request).execute(num_retries=5)
+                except HttpError as e:
+                    if e.resp.status != 409:
+                        raise
+            existing = self.bigquery_service.jobs().get(projectId=self.project_id,
+                jobId=request["jobReference"]["jobId"]).execute(num_retries=2)
+            if _reattachable(existing, request):
+                self.instrumentation.count("job.reattached")
+                return existing
+            attempt += 1
+            request["jobReference"]["jobId"] = _retry_id(job_id, attempt)
             
     ### essential DBMS functions
-    def createTable(self, tableName, datasetId=None):
+    def createTable(self, tableName, datasetId=None, schema=None):
         if not datasetId:
                 datasetId = self.dataset
-        #create an empty table
         table_service = self.bigquery_service.tables()
-        table_service.insert(projectId=self.project_id,
-            datasetId=datasetId, body={
+        table_service.insert(projectId=self.project_id, datasetId=datasetId,
+            body=self._table_body(tableName, datasetId, schema)).execute()
+        self._invalidate(tableName, datasetId)
+
+    def _table_body(self, tableName, datasetId, schema=None):
+        #an empty table
+        body = {
             "tableReference" :{
                 "projectId":self.project_id,
                 "tableId":tableName,
                 "datasetId":datasetId
             }
-        }).execute()
-        
+        }
+        if schema:
+            body["schema"] = {"fields": [{"name":i[0], "type":i[-1]} for i in schema]}
+        return body
+
+    def createTables(self, tables, datasetId=None, batch_size=BATCH_LIMIT):
+        """
+        Creates many tables in a few batch requests.  tables holds table
+        names or (tableName, schema) pairs.  Returns {tableName: error},
+        where error is None or the HttpError for that table.
+        >>> sorted(BQ.createTables(["my_batch_a", ("my_batch_b", [("id", "INTEGER")])]).items())
+        [('my_batch_a', None), ('my_batch_b', None)]
+        >>> BQ.dropTables(["my_batch_a", "my_batch_b", "my_batch_c"])["my_batch_c"].resp.status
+        404
+        """
+        if not datasetId:
+            if not self.dataset:
+                raise LittleBigQueryException("No datasetId specified.")
+            else:
+                datasetId = self.dataset
+        tables = [t if isinstance(t, (tuple, list)) else (t, None) for t in tables]
+        table_service = self.bigquery_service.tables()
+        results = self._batch([(name, table_service.insert(projectId=self.project_id,
+            datasetId=datasetId, body=self._table_body(name, datasetId, schema)))
+            for name, schema in tables], batch_size)
+        for name in results:
+            self._invalidate(name, datasetId)
+        return dict((name, error) for name, (response, error) in results.items())
         
     #createPartitionedTable
     def createPartitionedTable(self, tableName, expiration=0, datasetId=None):
@@ -180,6 +1230,7 @@ class LittleBigQuery(object):
             },
             "timePartitioning": partitioning
         }).execute()
+        self._invalidate(tableName, datasetId)
         
     #dropTable
     def dropTable(self, tableId, datasetId=None):
@@ -191,10 +1242,81 @@ class LittleBigQuery(object):
             
         self.bigquery_service.tables().delete(projectId=self.project_id, 
             datasetId=datasetId, tableId=tableId).execute()
+        self._invalidate(tableId, datasetId)
+
+    def dropTables(self, tableIds, datasetId=None, batch_size=BATCH_LIMIT):
+        """
+        Drops many tables in a few batch requests.  Returns
+        {tableId: error}, where error is None or the HttpError for that
+        table (a 404 if it did not exist).
+        """
+        if not datasetId:
+            if not self.dataset:
+                raise LittleBigQueryException("No datasetId specified.")
+            else:
+                datasetId = self.dataset
+        table_service = self.bigquery_service.tables()
+        results = self._batch([(tableId, table_service.delete(projectId=self.project_id,
+            datasetId=datasetId, tableId=tableId)) for tableId in tableIds], batch_size)
+        for tableId in results:
+            self._invalidate(tableId, datasetId)
+        return dict((tableId, error) for tableId, (response, error) in results.items())
+
+    def _batch(self, requests, batch_size=BATCH_LIMIT, max_attempts=5):
+        """
+        Sends (key, request) pairs as batch requests of up to batch_size
+        calls each.  Calls that fail with a 5xx or rate limit error are
+        sent again in a later batch, with backoff; rate limit errors
+        also slow down rate_limiter.  Returns an ordered
+        {key: (response, error)}, where exactly one of the two is None.
+        """
+        batch_size = max(1, min(batch_size, BATCH_LIMIT))
+        results = OrderedDict((key, None) for key, request in requests)
+        limiter = self.rate_limiter or RateLimiter()
+        pending = list(requests)
+        delays = self.backoff.delays()
+        for attempt in range(max_attempts):
+            retry = []
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                def callback(request_id, response, exception, chunk=chunk):
+                    key, request = chunk[int(request_id)]
+                    results[key] = (response, exception)
+                    if not isinstance(exception, HttpError):
+                        return
+                    throttled = is_throttled(exception.resp.status, exception.content)
+                    if throttled:
+                        limiter.throttled()
+                    if attempt + 1 < max_attempts \
+                        and (exception.resp.status >= 500 or throttled):
+                        retry.append((key, request))
+                batch = self.bigquery_service.new_batch_http_request(callback=callback)
+                for i, (key, request) in enumerate(chunk):
+                    batch.add(request, request_id=str(i))
+                # every call in a batch counts against the rate limit;
+                # http takes the token of the batch request itself
+                limiter.acquire(len(chunk) - 1)
+                batch.execute()
+            if not retry:
+                break
+            self.instrumentation.count("retries", len(retry), operation="batch")
+            time.sleep(next(delays))
+            pending = retry
+        return results
     
     #partitionTable
-    def partitionTable(self, oldTableName, newTableName, partitionKey, datasetId=None):
+    def partitionTable(self, oldTableName, newTableName, partitionKey, datasetId=None,
+        max_jobs=8, priority=None):
         """
+        Copies oldTableName into a new day-partitioned table, using the
+        TIMESTAMP column partitionKey.  One query lists the distinct
+        days, then each newTableName$YYYYMMDD partition is written
+        straight from a filtered query, with up to max_jobs partition
+        jobs running at once.  Partitions that already hold data are
+        skipped, so an interrupted run can simply be started again.
+        Rows with a NULL partitionKey are not copied.  With priority
+        "BATCH" the partition jobs queue behind interactive work
+        instead of competing with it for the concurrent query limit.
         >>> BQ.createTableFromCSV("my_gcs_table", [("id", "INTEGER"), ("email", "STRING"), ("amount", "FLOAT"), ("event_time","TIMESTAMP")], "gs://little_big_query_test/csv/*", "little_big_query_test")
         Waiting for job to finish...
         Job complete.
@@ -218,81 +1340,268 @@ class LittleBigQuery(object):
                 datasetId = self.dataset
         
         #first, create a partitioned table that's empty
-        self.createPartitionedTable(newTableName, datasetId=datasetId)
+        try:
+            self.createPartitionedTable(newTableName, datasetId=datasetId)
+            filled = set()
+        except HttpError as e:
+            if e.resp.status != 409:
+                raise
+            #the table is left over from an earlier run; resume it
+            filled = set(self.showPartitions(newTableName, datasetId)["partition_id"])
         
-        #gather the years
-        year_query = "SELECT YEAR(%s) as my_years FROM %s.%s GROUP BY 1;" % (partitionKey,datasetId,oldTableName)
-        my_years = self.query(year_query)["my_years"].tolist()
-        #make yearly shards for the old table
-        for y in my_years:
-            tempTableName = oldTableName + "_" + str(y)
-            extractQuery = "SELECT * from %s.%s WHERE YEAR(%s) = %d" % (datasetId, oldTableName, partitionKey, y)
-            self.createTableAsSelect(extractQuery, tempTableName)
-            #get the months in this shard
-            month_query = "SELECT MONTH(%s) as my_months FROM %s.%s GROUP BY 1;" % (partitionKey,datasetId,tempTableName)
-            my_months = self.query(month_query)["my_months"].tolist()
-            #make monthly sub-shards
-            for mon in my_months:
-                monTempTable = "%s_%d%02d" % (oldTableName, y, mon)
-                mextractQuery = "SELECT * from %s.%s WHERE MONTH(%s) = %d" % (datasetId, tempTableName, partitionKey, mon)
-                self.createTableAsSelect(mextractQuery, monTempTable)
-                #make daily sub-sub-shards
-                day_query = "SELECT DAY(%s) as my_days FROM %s.%s GROUP BY 1;" % (partitionKey,datasetId,monTempTable)
-                my_days = self.query(day_query)["my_days"].tolist()
-                for day in my_days:
-                    dayTempTable = "%s_%d%02d%02d" % (oldTableName, y, mon, day)
-                    dextractQuery = "SELECT * from %s.%s WHERE DAY(%s) = %d" % (datasetId, monTempTable, partitionKey, day)
-                    #create the daily tables
-                    self.createTableAsSelect(dextractQuery, dayTempTable)
-                    #copy that table into the new partition
-                    partition = "%s$%d%02d%02d" % (newTableName, y, mon, day)
-                    # get a new job ID
-                    job_id = str(uuid.uuid4())
+        #gather the days in one pass
+        day_query = ("SELECT YEAR(%s) as y, MONTH(%s) as m, DAY(%s) as d "
+            "FROM %s.%s WHERE %s IS NOT NULL GROUP BY 1, 2, 3;") % (partitionKey,
+            partitionKey, partitionKey, datasetId, oldTableName, partitionKey)
+        days = self.query(day_query)
+        days = sorted(date(int(y), int(m), int(d))
+            for y, m, d in zip(days["y"], days["m"], days["d"]))
         
-                    # structure the request
-                    request = {
-                        "jobReference" : {
-                            "projectId" : self.project_id,
-                            "job_id" : job_id
-                        },
-                        "configuration" : {
-                           "copy": {
-                                 "sourceTable": {       
-                                   "projectId": self.project_id,
-                                   "datasetId": datasetId,
-                                   "tableId": dayTempTable
-                                 },
-                                 "destinationTable": {  
-                                   "projectId": self.project_id,
-                                   "datasetId": datasetId,
-                                   "tableId": partition
-                                 },
-                                 # "createDisposition": string,  // Optional
-                                 # "writeDisposition": string,   // Optional
-                               },
-                           }
-                    }
+        def partition_job(day):
+            #each partition is filled by one atomic WRITE_TRUNCATE query
+            extractQuery = ("SELECT * FROM %s.%s WHERE %s >= TIMESTAMP('%s') "
+                "AND %s < TIMESTAMP('%s')") % (datasetId, oldTableName,
+                partitionKey, day.isoformat(), partitionKey,
+                (day + timedelta(days=1)).isoformat())
+            partition = "%s$%s" % (newTableName, day.strftime("%Y%m%d"))
+            return lambda: self._submit_query_to_table(extractQuery, partition,
+                datasetId, writeDisposition="WRITE_TRUNCATE", priority=priority)
+        
+        self._schedule([partition_job(day) for day in days
+            if day.strftime("%Y%m%d") not in filled], max_jobs)
 
-                    this_job = self.bigquery_service.jobs().insert(
-                        projectId=self.project_id,
-                        body=request).execute(num_retries=5)
+    def _schedule(self, submitters, max_jobs):
+        """Starts a job for each callable in submitters, keeping at most
+        max_jobs of them running at once.  Returns the job results in
+        order; raises RuntimeError as soon as one job fails.
+        """
+        submitters = list(submitters)
+        results = [None] * len(submitters)
+        running = {}
+        next_job = 0
+        delays = self.backoff.delays()
+        while next_job < len(submitters) or running:
+            while next_job < len(submitters) and len(running) < max_jobs:
+                running[submitters[next_job]()] = next_job
+                next_job += 1
+            finished = [job for job in running if job.done()]
+            for job in finished:
+                results[running.pop(job)] = job.result(silent=True)
+            if finished:
+                delays = self.backoff.delays()
+            elif running:
+                time.sleep(next(delays))
+        return results
+
+    #copyTable
+    def copyTable(self, sourceTable, destinationTable, datasetId=None,
+        writeDisposition=None, job_id=None):
+        self.submit_copyTable(sourceTable, destinationTable, datasetId,
+            writeDisposition, job_id).result()
+
+    def submit_copyTable(self, sourceTable, destinationTable, datasetId=None,
+        writeDisposition=None, job_id=None):
+        """
+        Like copyTable, but returns a Job as soon as the job is
+        inserted instead of waiting for it.  writeDisposition
+        "WRITE_TRUNCATE" replaces destinationTable and "WRITE_APPEND"
+        adds to it; by default the copy fails if it holds rows.
+        """
+        if not datasetId:
+            if not self.dataset:
+                raise LittleBigQueryException("No datasetId specified.")
+            else:
+                datasetId = self.dataset
+
+        # structure the request
+        request = {
+            "configuration" : {
+               "copy": {
+                     "sourceTable": {
+                       "projectId": self.project_id,
+                       "datasetId": datasetId,
+                       "tableId": sourceTable
+                     },
+                     "destinationTable": {
+                       "projectId": self.project_id,
+                       "datasetId": datasetId,
+                       "tableId": destinationTable
+                     },
+                     # "createDisposition": string,  // Optional
+                     # "writeDisposition": string,   // Optional
+                   },
+               }
+        }
+        if writeDisposition:
+            request["configuration"]["copy"]["writeDisposition"] = writeDisposition
+
+        this_job = self._insert_job(request, job_id, kind="copy")
+        return self._write_job(this_job, destinationTable, datasetId)
+
+    #extract
+    def extract(self, tableName, path=None, datasetId=None,
+        format="NEWLINE_DELIMITED_JSON", file_format="parquet"):
+        """
+        Reads a whole table through an extract job instead of paging
+        through it: the table is exported to compressed shards under
+        export_uri, which are downloaded and decoded fetch_workers at a
+        time and deleted afterwards.  Much faster than query() for big
+        tables.  Returns a data frame, or, given path, writes the table
+        there (see query_to_file) and returns the number of rows.
+
+        Arguments:
+            tableName: the table to read
+            path: a Parquet or Feather file to write instead of returning a frame
+            format: the shard format, "NEWLINE_DELIMITED_JSON" or "AVRO"
+                (needs fastavro)
+            file_format: "parquet" or "feather", when writing to path
+        """
+        if not datasetId:
+            if not self.dataset:
+                raise LittleBigQueryException("No datasetId specified.")
+            else:
+                datasetId = self.dataset
+        table = self._get_table(tableName, datasetId)
+        return self._extract_table(table, path, format, file_format)
+
+    def submit_extract(self, tableName, destinationUri, datasetId=None,
+        format="NEWLINE_DELIMITED_JSON", compression=None, projectId=None, job_id=None):
+        """
+        Inserts an extract job writing tableName to destinationUri, a
+        gs:// URI that may contain one * to shard the output, and
+        returns its Job.
+        """
+        if not datasetId:
+            if not self.dataset:
+                raise LittleBigQueryException("No datasetId specified.")
+            else:
+                datasetId = self.dataset
+        if format not in EXPORT_COMPRESSION:
+            raise LittleBigQueryException("Unknown export format: %s" % format)
+
+        request = {
+            "configuration" : {
+                "extract" : {
+                    "sourceTable" : {
+                        "projectId" : projectId or self.project_id,
+                        "datasetId" : datasetId,
+                        "tableId" : tableName
+                    },
+                    "destinationUris" : [destinationUri],
+                    "destinationFormat" : format,
+                    "compression" : compression or EXPORT_COMPRESSION[format]
+                }
+            }
+        }
+        return Job(self, self._insert_job(request, job_id, kind="extract"))
+
+    def _export_table(self, job, via_export):
+        """The table resource of a finished query's destination when its
+        result should be read through an extract job, else None."""
+        if via_export is False:
+            return None
+        if via_export is None and (self.export_uri is None or
+            (self.export_rows is None and self.export_bytes is None)):
+            return None
+        if via_export is None and _ORDER_BY.search(
+            job.resource['configuration']['query'].get('query', '')):
+            return None
+        if self.export_uri is None:
+            raise LittleBigQueryException("No export_uri configured.")
+        reference = job.resource['configuration']['query']['destinationTable']
+        table = self.bigquery_service.tables().get(projectId=reference['projectId'],
+            datasetId=reference['datasetId'], tableId=reference['tableId']
+            ).execute(num_retries=5)
+        if via_export:
+            return table
+        if self.export_rows is not None and int(table.get('numRows', 0)) >= self.export_rows:
+            return table
+        if self.export_bytes is not None and int(table.get('numBytes', 0)) >= self.export_bytes:
+            return table
+        return None
+
+    def _extract_table(self, table, path=None, format="NEWLINE_DELIMITED_JSON",
+        file_format="parquet"):
+        if self.export_uri is None:
+            raise LittleBigQueryException("No export_uri configured.")
+        reference = table['tableReference']
+        fields = table['schema']['fields']
+        suffix = ".avro" if format == "AVRO" else ".json.gz"
+        pattern = "%s/%s/part-*%s" % (self.export_uri.rstrip("/"), uuid.uuid4().hex, suffix)
+        store = self.export_store
+        with self.instrumentation.span("extract", table=reference['tableId']) as span:
+            self.submit_extract(reference['tableId'], pattern, reference['datasetId'],
+                format, projectId=reference['projectId']).wait()
+            uris = store.list(pattern)
+            span.tags["shards"] = len(uris)
+            try:
+                return self._read_shards(uris, fields, format, path, file_format)
+            finally:
+                for uri in uris:
+                    store.delete(uri)
+
+    def _read_shards(self, uris, fields, format, path=None, file_format="parquet"):
+        """Downloads and decodes extract shards fetch_workers at a time,
+        keeping their order.  Returns the concatenated frame, or writes it
+        to path and returns the number of rows."""
+        parent = self.instrumentation.current()
+        def read(uri):
+            fd, local = tempfile.mkstemp()
+            try:
+                with self.instrumentation.span("extract.download", parent=parent, uri=uri):
+                    with os.fdopen(fd, "wb") as f:
+                        self.export_store.download(uri, f)
+                with self.instrumentation.span("extract.decode", parent=parent, uri=uri):
+                    columns = read_shard(local, fields, format)
+                    if not fields:
+                        return pd.DataFrame()
+                    return pd.concat([self._decode_export_column(values, f["type"])
+                        for values, f in zip(columns, fields)], axis=1,
+                        keys=[f["name"] for f in fields])
+            finally:
+                os.remove(local)
+
+        writer = SpoolWriter(path, fields, file_format) if path is not None else None
+        frames = []
+        workers = max(1, min(self.fetch_workers, len(uris)))
+        pool = ThreadPool(workers)
+        def keep(frame):
+            if writer is not None:
+                writer.write(frame)
+            else:
+                frames.append(frame)
+        try:
+            # at most workers shards are read ahead of the one being kept,
+            # so writing to path needs memory for a few shards only
+            pending = []
+            for uri in uris:
+                pending.append(pool.apply_async(read, (uri,)))
+                if len(pending) > workers:
+                    keep(pending.pop(0).get())
+            for p in pending:
+                keep(p.get())
+        except Exception:
+            if writer is not None:
+                writer.abort()
+            raise
+        finally:
+            pool.terminate()
+        rows = sum(len(f) for f in frames)
+        self.instrumentation.count("rows_fetched", writer.rows if writer else rows)
+        if writer is not None:
+            writer.close()
+            return writer.rows
+        if not frames:
+            return self._decode_frame([], {"fields": fields})
+        return pd.concat(frames, ignore_index=True)
 
-                    partition_ready = self._poll_job(this_job)
-                    
-                    #delete the shard
-                    self.dropTable(dayTempTable)
-                self.dropTable(monTempTable)
-            self.dropTable(tempTableName)
-                
-                
-                
-        
     #listPartitions
     def showPartitions(self, tableName, datasetId=None):
         if not datasetId:
                 datasetId = self.dataset
         q = "select partition_id from [%s.%s$__PARTITIONS_SUMMARY__]" % (datasetId, tableName)
-        return self.query(q)
+        return self._cached("partitions", (self.project_id, datasetId, tableName),
+            lambda: self.query(q))
     
     #describeTable
     def desc(self, tableName, datasetId=None):
@@ -307,41 +1616,182 @@ class LittleBigQuery(object):
         if not datasetId:
                 datasetId = self.dataset
         
+        return self._cached("schema", (self.project_id, datasetId, tableName),
+            lambda: self._get_table(tableName, datasetId)["schema"]["fields"])
+
+    def describeTables(self, tableNames, datasetId=None, batch_size=BATCH_LIMIT):
+        """
+        Like desc for many tables, fetching the schemas that are not in
+        the metadata catalog in a few batch requests.  Returns
+        {tableName: fields}, or the HttpError for tables that could not
+        be read.
+        """
+        if not datasetId:
+                datasetId = self.dataset
+        schemas = {}
+        missing = []
+        for name in tableNames:
+            cached = None
+            if self.catalog is not None:
+                cached = self.catalog.get("schema", self.project_id, datasetId, name)
+            if cached is None:
+                missing.append(name)
+            else:
+                schemas[name] = cached
+        for name, table in self._get_tables(missing, datasetId, batch_size).items():
+            schemas[name] = table
+            if not isinstance(table, Exception):
+                schemas[name] = table.get("schema", {}).get("fields", [])
+                if self.catalog is not None:
+                    self.catalog.put("schema", schemas[name], self.project_id,
+                        datasetId, name)
+        return schemas
+
+    def _get_tables(self, tableNames, datasetId, batch_size=BATCH_LIMIT):
+        """Batched tables().get: {tableName: table resource or HttpError}."""
         t = self.bigquery_service.tables()
-        ts = t.get(projectId=self.project_id, datasetId=datasetId, tableId=tableName).execute()
-        return ts["schema"]["fields"]
+        results = self._batch([(name, t.get(projectId=self.project_id,
+            datasetId=datasetId, tableId=name)) for name in tableNames], batch_size)
+        return OrderedDict((name, error or response)
+            for name, (response, error) in results.items())
+
+    def _get_table(self, tableName, datasetId):
+        t = self.bigquery_service.tables()
+        return t.get(projectId=self.project_id, datasetId=datasetId,
+            tableId=tableName).execute()
+
+    def prefetchDataset(self, datasetId=None):
+        """
+        Loads the table listing, every table schema and the partition
+        listing of every partitioned table in a dataset into the
+        metadata catalog in one pass.  Schemas are fetched with batch
+        requests; partitions come from a single query over all partition
+        summaries.
+        """
+        if self.catalog is None:
+            raise LittleBigQueryException("No metadata catalog configured.")
+        if not datasetId:
+            if not self.dataset:
+                raise LittleBigQueryException("No datasetId specified.")
+            else:
+                datasetId = self.dataset
+
+        listing = self._list_all(self.bigquery_service.tables(), "tables",
+            projectId=self.project_id, datasetId=datasetId)
+        self.catalog.put("tables", listing, self.project_id, datasetId)
+        names = [x["tableReference"]["tableId"] for x in listing]
+
+        for name, table in self._get_tables(names, datasetId).items():
+            if isinstance(table, Exception):
+                raise table
+            if "schema" in table:
+                self.catalog.put("schema", table["schema"]["fields"],
+                    self.project_id, datasetId, name)
+
+        partitioned = [x["tableReference"]["tableId"] for x in listing
+            if "timePartitioning" in x]
+        if partitioned:
+            q = "select table_id, partition_id from %s" % ", ".join(
+                "[%s.%s$__PARTITIONS_SUMMARY__]" % (datasetId, n) for n in partitioned)
+            summary = self.query(q, use_cache=False)
+            for name in partitioned:
+                partitions = summary[summary["table_id"] == name][["partition_id"]]
+                self.catalog.put("partitions", partitions.reset_index(drop=True),
+                    self.project_id, datasetId, name)
+
+    def _cached(self, kind, key, fetch):
+        """Returns the catalog entry for (kind, key), calling fetch and
+        storing its result on a miss."""
+        if self.catalog is None:
+            return fetch()
+        value = self.catalog.get(kind, *key)
+        if value is None:
+            value = fetch()
+            self.catalog.put(kind, value, *key)
+        return value
     
     #appendTableAsSelect
-    def appendTableAsSelect(self, q, tableName, datasetId=None):
-        # get a new job ID
-        job_id = str(uuid.uuid4())
-        
+    def appendTableAsSelect(self, q, tableName, datasetId=None, **kwargs):
+        self.submit_appendTableAsSelect(q, tableName, datasetId, **kwargs).result()
+
+    def submit_appendTableAsSelect(self, q, tableName, datasetId=None,
+        createDisposition="CREATE_IF_NEEDED", partitionField=None,
+        clusteringFields=None, job_id=None, priority=None, standardSQL=False):
+        """
+        Like appendTableAsSelect, but returns a Job as soon as the job is
+        inserted instead of waiting for it.  The table is created if it
+        doesn't exist, unless createDisposition is "CREATE_NEVER".
+        """
+        return self._submit_query_to_table(q, tableName, datasetId,
+            writeDisposition="WRITE_APPEND", createDisposition=createDisposition,
+            partitionField=partitionField, clusteringFields=clusteringFields,
+            job_id=job_id, priority=priority, standardSQL=standardSQL)
+
+    def _submit_query_to_table(self, q, tableName, datasetId=None, writeDisposition=None,
+        createDisposition=None, partitionField=None, clusteringFields=None, job_id=None,
+        priority=None, standardSQL=False):
+        """Inserts one query job writing its result to tableName with the
+        given dispositions.  q is legacy SQL unless standardSQL is set or
+        it starts with #standardSQL.  partitionField partitions a table
+        the job creates by day on that column, and clusteringFields
+        clusters it; legacy SQL can't write such tables, so both need
+        standard SQL.
+        """
+        if not datasetId:
+            if not self.dataset:
+                raise LittleBigQueryException("No datasetId specified.")
+            else:
+                datasetId = self.dataset
+        standardSQL = self._standard_sql(q, standardSQL, partitionField,
+            clusteringFields)
+
         #query and fill the table
         request = {
-            "jobReference" : {
-                "projectId" : self.project_id,
-                "job_id" : job_id
-            },
             "configuration" : {
                 "query" :{
                     "query" : q,
-                    "priority" : 'INTERACTIVE',
+                    "priority" : priority or self.priority,
                     "destinationTable" : {
                         "projectId" : self.project_id,
                         "datasetId": datasetId,
                         "tableId" : tableName
-                        },
-                    "allowLargeResults" : 'true'
+                        }
                     }
             }
         }
-        this_job = self.bigquery_service.jobs().insert(
-            projectId=self.project_id,
-            body=request).execute(num_retries=5)
-        ready = self._poll_job(this_job)
+        query = request["configuration"]["query"]
+        if standardSQL:
+            query["useLegacySql"] = False
+        else:
+            query["allowLargeResults"] = 'true'
+        if writeDisposition:
+            query["writeDisposition"] = writeDisposition
+        if createDisposition:
+            query["createDisposition"] = createDisposition
+        if partitionField:
+            query["timePartitioning"] = {"type": "DAY", "field": partitionField}
+        if clusteringFields:
+            query["clustering"] = {"fields": list(clusteringFields)}
+        this_job = self._insert_job(request, job_id,
+            write=writeDisposition or "WRITE_EMPTY")
+        return self._write_job(this_job, tableName, datasetId)
+
+    def _standard_sql(self, q, standardSQL, partitionField=None, clusteringFields=None):
+        """
+        Whether q runs as standard SQL: when asked to, or when it starts
+        with #standardSQL.  Raises if it would run as legacy SQL but has
+        to write a column-partitioned or clustered table.
+        >>> BQ._standard_sql("#standardSQL\\nSELECT 1", False, "day")
+        True
+        """
+        standardSQL = bool(standardSQL or q.lstrip().lower().startswith("#standardsql"))
+        if not standardSQL and (partitionField or clusteringFields):
+            raise LittleBigQueryException("partitionField and clusteringFields "
+                "need a standard SQL query: pass standardSQL=True.")
+        return standardSQL
         
     #createTableAsSelect
-    def createTableAsSelect(self, q, tableName, datasetId=None):
+    def createTableAsSelect(self, q, tableName, datasetId=None, **kwargs):
         """
         >>> BQ.createTableFromCSV("my_gcs_table", [("id", "INTEGER"), ("email", "STRING"), ("amount", "FLOAT"), ("event_time", "TIMESTAMP")], "gs://little_big_query_test/csv/*", "little_big_query_test")
         Waiting for job to finish...
@@ -357,49 +1807,102 @@ class LittleBigQuery(object):
         >>> BQ.dropTable("my_gcs_table")
         >>> BQ.dropTable("my_agg_table")
         """
+        self.submit_createTableAsSelect(q, tableName, datasetId, **kwargs).result()
+
+    def submit_createTableAsSelect(self, q, tableName, datasetId=None,
+        partitionField=None, clusteringFields=None, job_id=None, priority=None,
+        standardSQL=False):
+        """
+        Like createTableAsSelect, but returns a Job as soon as the job is
+        inserted instead of waiting for it.  A single query job creates
+        and fills the table; it fails if the table already holds rows.
+        """
+        return self._submit_query_to_table(q, tableName, datasetId,
+            writeDisposition="WRITE_EMPTY", createDisposition="CREATE_IF_NEEDED",
+            partitionField=partitionField, clusteringFields=clusteringFields,
+            job_id=job_id, priority=priority, standardSQL=standardSQL)
+
+    #replaceTableAsSelect
+    def replaceTableAsSelect(self, q, tableName, datasetId=None, **kwargs):
+        """
+        Replaces the contents of tableName, creating it if needed, with
+        the result of q.  Readers see the old rows until the new ones are
+        committed, never an empty table.
+        >>> BQ.createTableAsSelect("select 1 as x", "my_hot_table")
+        Waiting for job to finish...
+        Job complete.
+        >>> BQ.replaceTableAsSelect("select 2 as x", "my_hot_table", swap=True)
+        Waiting for job to finish...
+        Job complete.
+        >>> BQ.query("select x from my_hot_table")
+        Waiting for job to finish...
+        Job complete.
+           x
+        0  2
+        >>> BQ.dropTable("my_hot_table")
+        """
+        self.submit_replaceTableAsSelect(q, tableName, datasetId, **kwargs).result()
+
+    def submit_replaceTableAsSelect(self, q, tableName, datasetId=None, swap=False,
+        partitionField=None, clusteringFields=None, job_id=None, priority=None,
+        standardSQL=False):
+        """
+        Like replaceTableAsSelect, but returns a Job as soon as the job is
+        inserted instead of waiting for it.
+
+        By default one WRITE_TRUNCATE query job replaces the table.  With
+        swap, the result is first built in a staging table next to it,
+        which Job.result() then copies over tableName with one
+        WRITE_TRUNCATE copy job (a quick metadata operation) and drops;
+        a failed or slow rebuild then never touches the live table.
+        With job_id (or idempotent_jobs and a run_key) the staging table
+        is named after the job, so a resubmitted swap reattaches to the
+        same jobs.
+        """
         if not datasetId:
             if not self.dataset:
                 raise LittleBigQueryException("No datasetId specified.")
             else:
                 datasetId = self.dataset
-        
-        #create an empty table
-        table_service = self.bigquery_service.tables()
-        table_service.insert(projectId=self.project_id,
-            datasetId=datasetId, body={
-            "tableReference" :{
-                "projectId":self.project_id,
-                "tableId":tableName,
-                "datasetId":datasetId
-            }
-        }).execute()
-        # get a new job ID
-        job_id = str(uuid.uuid4())
-        
-        #query and fill the table
-        request = {
-            "jobReference" : {
-                "projectId" : self.project_id,
-                "job_id" : job_id
-            },
-            "configuration" : {
-                "query" :{
-                    "query" : q,
-                    "priority" : 'INTERACTIVE',
-                    "destinationTable" : {
-                        "projectId" : self.project_id,
-                        "datasetId": datasetId,
-                        "tableId" : tableName
-                        },
-                    "allowLargeResults" : 'true'
-                    }
-            }
-        }
-        this_job = self.bigquery_service.jobs().insert(
-            projectId=self.project_id,
-            body=request).execute(num_retries=5)
-        ready = self._poll_job(this_job)
+        if not swap:
+            return self._submit_query_to_table(q, tableName, datasetId,
+                writeDisposition="WRITE_TRUNCATE", createDisposition="CREATE_IF_NEEDED",
+                partitionField=partitionField, clusteringFields=clusteringFields,
+                job_id=job_id, priority=priority, standardSQL=standardSQL)
+
+        staging = self._swap_staging(tableName, job_id, q, datasetId,
+            partitionField, clusteringFields, standardSQL)
+        build = self._submit_query_to_table(q, staging, datasetId,
+            writeDisposition="WRITE_TRUNCATE", createDisposition="CREATE_IF_NEEDED",
+            partitionField=partitionField, clusteringFields=clusteringFields,
+            job_id=job_id, priority=priority, standardSQL=standardSQL)
+        self._invalidate(tableName, datasetId)
+        def finish(job):
+            try:
+                return self.submit_copyTable(staging, tableName, datasetId,
+                    writeDisposition="WRITE_TRUNCATE",
+                    job_id=job_id and job_id + "_swap").result(silent=True)
+            finally:
+                try:
+                    self.dropTable(staging, datasetId)
+                except HttpError as e:
+                    # dropped already, by the run this one reattached to
+                    if e.resp.status != 404:
+                        raise
+        return Job(self, build.resource, finish)
             
+    def _swap_staging(self, tableName, job_id=None, *settings):
+        """The staging table a swap into tableName builds: named after
+        job_id (or run_key, with idempotent_jobs) and the swap's
+        settings if there is one, so a resubmitted swap finds it again,
+        otherwise random."""
+        if job_id is not None or (self.idempotent_jobs and self.run_key is not None):
+            key = json.dumps([job_id, self.run_key, tableName] + list(settings))
+            token = hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+        else:
+            token = uuid.uuid4().hex[:12]
+        return "%s_swap_%s" % (tableName, token)
+
     #useDataset
     def useDataset(self, datasetId):
         self.dataset = datasetId
@@ -425,6 +1928,7 @@ class LittleBigQuery(object):
             }
         ds = self.bigquery_service.datasets()
         ds.insert(projectId=self.project_id, body=request).execute()
+        self._invalidate_dataset(datasetName)
         #check to make sure it's been created
         try:
             ds.get(projectId=self.project_id, datasetId=datasetName)
@@ -443,6 +1947,7 @@ class LittleBigQuery(object):
                 datasetId=datasetName, deleteContents=deleteContents).execute()
         except:
             pass
+        self._invalidate_dataset(datasetName)
 
     #showDatasets
     def showDatasets(self):
@@ -452,9 +1957,12 @@ class LittleBigQuery(object):
         >>> BQ.showDatasets()
         [u'green', u'yellow']
         """
+        listing = self._cached("datasets", (self.project_id,), self._list_datasets)
+        return list(map(lambda x: x["datasetReference"]["datasetId"], listing))
+
+    def _list_datasets(self):
         ds = self.bigquery_service.datasets()
-        return map(lambda x: x["datasetReference"]["datasetId"], 
-            ds.list(projectId=self.project_id).execute()["datasets"])
+        return self._list_all(ds, "datasets", projectId=self.project_id)
             
     def datasets(self):
         """
@@ -482,10 +1990,20 @@ class LittleBigQuery(object):
                 dsID = self.dataset
         else:
             dsID = datasetId
-        listing = ts.list(projectId=self.project_id, 
-            datasetId=dsID).execute()
-        return map(lambda x: x["tableReference"]["tableId"], 
-            listing["tables"])
+        listing = self._cached("tables", (self.project_id, dsID),
+            lambda: self._list_all(ts, "tables", projectId=self.project_id,
+                datasetId=dsID))
+        return list(map(lambda x: x["tableReference"]["tableId"], listing))
+
+    def _list_all(self, collection, field, **kwargs):
+        """Follows nextPageToken through a datasets/tables listing."""
+        items = []
+        request = collection.list(**kwargs)
+        while request is not None:
+            response = request.execute(num_retries=2)
+            items.extend(response.get(field, []))
+            request = collection.list_next(request, response)
+        return items
             
     def tables(self, datasetId=None):
         """
@@ -500,9 +2018,9 @@ class LittleBigQuery(object):
         """
         
         prj = self.bigquery_service.projects().list().execute()
-        return map(lambda x: {"friendlyName":x["friendlyName"], 
+        return list(map(lambda x: {"friendlyName":x["friendlyName"], 
             "projectId":x["projectReference"]["projectId"]}, 
-            prj["projects"])
+            prj["projects"]))
             
     def projects(self):
         """
@@ -510,7 +2028,137 @@ class LittleBigQuery(object):
         """
         return self.listProjects()
             
+    #insert_rows
+    def insert_rows(self, tableName, rows, datasetId=None, **kwargs):
+        """
+        Streams rows (dicts of column name to value) into an existing
+        table with tabledata().insertAll, returning the rows BigQuery
+        rejected as [(row, insertErrors)].  kwargs are passed to
+        StreamWriter.
+        >>> BQ.createTable("my_stream_table", schema=[("id", "INTEGER"), ("email", "STRING")])
+        >>> BQ.insert_rows("my_stream_table", [{"id": 1, "email": "a@example.com"}])
+        []
+        >>> BQ.dropTable("my_stream_table")
+        """
+        with self.streamWriter(tableName, datasetId, **kwargs) as writer:
+            writer.write_rows(rows)
+        return writer.errors
+
+    def streamWriter(self, tableName, datasetId=None, **kwargs):
+        """
+        Returns a StreamWriter that batches rows into tableName in the
+        background.  Close it (or use it in a with block) when done.
+        """
+        if not datasetId:
+            if not self.dataset:
+                raise LittleBigQueryException("No datasetId specified.")
+            else:
+                datasetId = self.dataset
+        return StreamWriter(self, tableName, datasetId, **kwargs)
+
     #createTableFromFrame
+    def appendTableFromFrame(self, frame, tableName, datasetId=None, **kwargs):
+        self.createTableFromFrame(frame, tableName, datasetId, append=True, **kwargs)
+
+    def createTableFromFrame(self, frame, tableName, datasetId=None, append=False,
+        format="json", rows_per_job=500000, workers=4):
+        """
+        Loads a pandas data frame into a table.  The schema comes from
+        the frame's dtypes (see _frame_schema).  The frame is cut into
+        slices of rows_per_job rows; each slice is written to a
+        temporary newline-delimited JSON (format="json") or Parquet
+        (format="parquet", needs pyarrow) file and loaded by its own
+        job, with up to workers slices serialized and uploaded at once.
+        Unless append is set, the table is created first and must not
+        exist yet.
+        >>> BQ.createTableFromLocalCSV("my_frame_source", [("id", "INTEGER"), ("email", "STRING"), ("amount", "FLOAT"), ("event_time", "TIMESTAMP")], "examples/MOCK_DATA.csv", "little_big_query_test")
+        Waiting for job to finish...
+        Job complete.
+        >>> frame = BQ.query("select * from [little_big_query_test.my_frame_source]")
+        Waiting for job to finish...
+        Job complete.
+        >>> BQ.createTableFromFrame(frame, "my_frame_table")
+        >>> BQ.desc("my_frame_table")
+        [{u'type': u'INTEGER', u'name': u'id'}, {u'type': u'STRING', u'name': u'email'}, {u'type': u'FLOAT', u'name': u'amount'}, {u'type': u'TIMESTAMP', u'name': u'event_time'}]
+        >>> BQ.dropTable("my_frame_table")
+        >>> BQ.dropTable("my_frame_source")
+        """
+        if not datasetId:
+            if not self.dataset:
+                raise LittleBigQueryException("No datasetId specified.")
+            else:
+                datasetId = self.dataset
+        if format not in ("json", "parquet"):
+            raise LittleBigQueryException("Unknown frame format: %s" % format)
+
+        schema = self._frame_schema(frame)
+        if not append:
+            self.createTable(tableName, datasetId, schema)
+
+        starts = range(0, len(frame), rows_per_job)
+        pool = ThreadPool(max(1, min(workers, len(starts))))
+        try:
+            jobs = pool.map(lambda start: self._submit_frame_slice(
+                frame.iloc[start:start + rows_per_job], schema, tableName,
+                datasetId, format), starts)
+        finally:
+            pool.close()
+            pool.join()
+        self.wait_all(jobs)
+
+    def _frame_schema(self, frame):
+        """The reverse of _parse_schema: maps each column's dtype to a
+        BigQuery type, returning [(name, type), ...]."""
+        schema = []
+        for name, dtype in zip(frame.columns, frame.dtypes):
+            if pd.api.types.is_bool_dtype(dtype):
+                t = "BOOLEAN"
+            elif pd.api.types.is_integer_dtype(dtype):
+                t = "INTEGER"
+            elif pd.api.types.is_float_dtype(dtype):
+                t = "FLOAT"
+            elif pd.api.types.is_datetime64_any_dtype(dtype):
+                t = "TIMESTAMP"
+            else:
+                t = "STRING"
+            schema.append((str(name), t))
+        return schema
+
+    def _submit_frame_slice(self, frame, schema, tableName, datasetId, format):
+        """Serializes one slice of a frame to a temporary file and
+        uploads it as a WRITE_APPEND load job."""
+        suffix = ".json" if format == "json" else ".parquet"
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        try:
+            if format == "json":
+                frame.to_json(path, orient="records", lines=True,
+                    date_format="iso", date_unit="us")
+                sourceFormat = "NEWLINE_DELIMITED_JSON"
+            else:
+                frame.to_parquet(path, index=False, coerce_timestamps="us",
+                    allow_truncated_timestamps=True)
+                sourceFormat = "PARQUET"
+            request = {
+                'configuration' : {
+                    'load' : {
+                        'schema' : {
+                            'fields' : [{"name":i[0], "type":i[-1]} for i in schema]
+                        },
+                        'destinationTable' : {
+                            'projectId' : self.project_id,
+                            'datasetId' : datasetId,
+                            'tableId' : tableName
+                        },
+                        'sourceFormat' : sourceFormat,
+                        'writeDisposition' : "WRITE_APPEND"
+                    }
+                }
+            }
+            this_job = self._upload_job(request, path)
+        finally:
+            os.remove(path)
+        return self._write_job(this_job, tableName, datasetId)
     
     #createTableFromSheet
     def createTableFromSheet(self, tableName, schema, sheet_url, skip_rows=0, datasetId=None):
@@ -549,10 +2197,12 @@ class LittleBigQuery(object):
         this_job = self.bigquery_service.tables().insert(
             projectId=self.project_id, datasetId=datasetId,
             body=request).execute()
+        self._invalidate(tableName, datasetId)
         
     #createTableFromCSV
     def appendTableFromCSV(self, tableName, schema, gcs_path, datasetId=None):
-        self.createTableFromCSV(tableName, schema, gcs_path, datasetId)
+        self.submit_createTableFromCSV(tableName, schema, gcs_path, datasetId,
+            writeDisposition="WRITE_APPEND").result()
         
     def createTableFromCSV(self, tableName, schema, gcs_path, datasetId=None):
         """
@@ -566,43 +2216,20 @@ class LittleBigQuery(object):
         0   10
         >>> BQ.dropTable("my_gcs_table")
         """
-        if not datasetId:
-            if not self.dataset:
-                raise LittleBigQueryException("No datasetId specified.")
-            else:
-                datasetId = self.dataset
-                
-        job_id = str(uuid.uuid4())
-        
-        # structure the request
-        request = {
-            "jobReference" : {
-                "projectId" : self.project_id,
-                "job_id" : job_id
-                },
-            'configuration' : {
-                'load' : {
-                    'sourceUris' : [gcs_path],
-                    'schema' : {
-                        'fields' : [{"name":i[0], "type":i[-1]} for i in schema]
-                    },
-                    'destinationTable' : {
-                        'projectId' : self.project_id,
-                        'datasetId' : datasetId,
-                        'tableId' : tableName
-                    },
-                    'source_format' : "CSV"
-                }
-            } 
-        }
-        insert_job = self.bigquery_service.jobs().insert(projectId=self.project_id,
-            body=request)
-        
-        this_job = insert_job.execute(num_retries=5)
-        self._poll_job(this_job)
+        self.submit_createTableFromCSV(tableName, schema, gcs_path, datasetId).result()
+
+    def submit_createTableFromCSV(self, tableName, schema, gcs_path, datasetId=None,
+        writeDisposition=None, job_id=None):
+        """
+        Like createTableFromCSV, but returns a Job as soon as the job is
+        inserted instead of waiting for it.
+        """
+        return self._submit_load(tableName, schema, [gcs_path], "CSV", datasetId,
+            writeDisposition, job_id=job_id)
     
     def appendTableFromJSON(self, tableName, schema, gcs_path, datasetId=None):
-        self.createTableFromJSON(tableName, schema, gcs_path, datasetId)
+        self.submit_createTableFromJSON(tableName, schema, gcs_path, datasetId,
+            writeDisposition="WRITE_APPEND").result()
             
     def createTableFromJSON(self, tableName, schema, gcs_path, datasetId=None):
         """
@@ -616,46 +2243,20 @@ class LittleBigQuery(object):
         0   20
         >>> BQ.dropTable("my_json_table")
         """
-        if not datasetId:
-            if not self.dataset:
-                raise LittleBigQueryException("No datasetId specified.")
-            else:
-                datasetId = self.dataset
-            
-        job_id = str(uuid.uuid4())
-        
-        # structure the request
-        request = {
-         "jobReference": {
-          "projectId": self.project_id,
-          "jobId": job_id
-         },
-         "configuration": {
-          "load": {
-           'destinationTable' : {
-               'projectId' : self.project_id,
-               'datasetId' : datasetId,
-               'tableId' : tableName
-           },
-           "sourceFormat": "NEWLINE_DELIMITED_JSON",
-           "sourceUris": [
-            gcs_path
-           ],
-           "schema": {
-            "fields": [{"name":f[0], "type": f[1]} for f in schema]
-           }
-          }
-         }
-        }
+        self.submit_createTableFromJSON(tableName, schema, gcs_path, datasetId).result()
 
-        insert_job = self.bigquery_service.jobs().insert(projectId=self.project_id,
-            body=request)
-        
-        this_job = insert_job.execute(num_retries=5)
-        self._poll_job(this_job)
+    def submit_createTableFromJSON(self, tableName, schema, gcs_path, datasetId=None,
+        writeDisposition=None, job_id=None):
+        """
+        Like createTableFromJSON, but returns a Job as soon as the job is
+        inserted instead of waiting for it.
+        """
+        return self._submit_load(tableName, schema, [gcs_path],
+            "NEWLINE_DELIMITED_JSON", datasetId, writeDisposition, job_id=job_id)
 
     def appendTableFromAvro(self, tableName, schema, gcs_path, datasetId=None):
-        self.createTableFromAvro(tableName, schema, gcs_path, datasetId)
+        self.submit_createTableFromAvro(tableName, schema, gcs_path, datasetId,
+            writeDisposition="WRITE_APPEND").result()
             
     def createTableFromAvro(self, tableName, schema, gcs_path, datasetId=None):
         """
@@ -669,49 +2270,232 @@ class LittleBigQuery(object):
         0   10
         >>> BQ.dropTable("my_avro_table")
         """
+        self.submit_createTableFromAvro(tableName, schema, gcs_path, datasetId).result()
+
+    def submit_createTableFromAvro(self, tableName, schema, gcs_path, datasetId=None,
+        writeDisposition=None, job_id=None):
+        """
+        Like createTableFromAvro, but returns a Job as soon as the job is
+        inserted instead of waiting for it.
+        """
+        return self._submit_load(tableName, schema, [gcs_path], "AVRO", datasetId,
+            writeDisposition, job_id=job_id)
+
+    def _load_request(self, tableName, schema, sourceFormat, datasetId,
+        writeDisposition=None, sourceUris=None, skipLeadingRows=0):
+        """The body of a load job into tableName."""
+        load = {
+            'destinationTable' : {
+                'projectId' : self.project_id,
+                'datasetId' : datasetId,
+                'tableId' : tableName
+            },
+            'sourceFormat' : sourceFormat,
+            'schema' : {
+                'fields' : [{"name":i[0], "type":i[-1]} for i in schema]
+            }
+        }
+        if sourceUris:
+            load['sourceUris'] = list(sourceUris)
+        if writeDisposition:
+            load['writeDisposition'] = writeDisposition
+        if skipLeadingRows:
+            load['skipLeadingRows'] = skipLeadingRows
+        return {
+            'configuration' : {
+                'load' : load
+            }
+        }
+
+    def _submit_load(self, tableName, schema, sourceUris, sourceFormat, datasetId=None,
+        writeDisposition=None, skipLeadingRows=0, job_id=None):
+        """Inserts one load job from Cloud Storage and returns its Job."""
         if not datasetId:
             if not self.dataset:
                 raise LittleBigQueryException("No datasetId specified.")
             else:
                 datasetId = self.dataset
-        job_id = str(uuid.uuid4())
-        
-        # structure the request
-        request = {
-         "jobReference": {
-          "projectId": self.project_id,
-          "jobId": job_id
-         },
-         "configuration": {
-          "load": {
-           "destinationTable": {
-            "projectId": self.project_id,
-            "datasetId": datasetId,
-            "tableId": tableName
-           },
-           "sourceFormat": "AVRO",
-           "sourceUris": [
-            gcs_path
-           ],
-          "schema": {
-           "fields": [{"name":f[0], "type": f[1]} for f in schema]
-           }
-          }
-         }
-        }
-        
-        insert_job = self.bigquery_service.jobs().insert(projectId=self.project_id,
-            body=request)
-        
-        this_job = insert_job.execute(num_retries=5)
-        self._poll_job(this_job)
+        request = self._load_request(tableName, schema, sourceFormat, datasetId,
+            writeDisposition, sourceUris, skipLeadingRows)
+        this_job = self._insert_job(request, job_id, kind="load", files=len(sourceUris))
+        return self._write_job(this_job, tableName, datasetId)
+
+    #bulkLoad
+    def bulkLoad(self, tableName, schema, sources, datasetId=None, format="CSV",
+        writeDisposition="WRITE_APPEND", skipLeadingRows=0,
+        max_files_per_job=MAX_LOAD_FILES, max_bytes_per_job=MAX_LOAD_BYTES, max_jobs=4):
+        """
+        Loads many files into one table with as few load jobs as the
+        per-job limits allow, running up to max_jobs of them at once.
+
+        sources is a list of gs:// URIs (which may contain * wildcards),
+        local files, local directories (every file in them) and local
+        glob patterns.  Cloud Storage wildcards are expanded through
+        export_store, so that the files can be grouped into jobs of at
+        most max_files_per_job files and max_bytes_per_job bytes.  Local
+        CSV and JSON files are concatenated, gzipped, into one upload per
+        job (with skipLeadingRows header lines dropped from every file),
+        spread over at least max_jobs uploads; other local formats are
+        uploaded one file per job.
+
+        writeDisposition applies to the table as a whole: with
+        "WRITE_APPEND" the jobs append to tableName directly; with
+        "WRITE_TRUNCATE" or "WRITE_EMPTY" and more than one job, they
+        load a staging table that then replaces (or fills) tableName in
+        one copy job, so a partial load is never visible.  Returns the
+        finished load job resources.
+        >>> jobs = BQ.bulkLoad("my_bulk_table", [("id", "INTEGER"), ("email", "STRING"), ("amount", "FLOAT"), ("event_time", "TIMESTAMP")], ["examples/MOCK_DATA.csv", "examples/MOCK_DATA.csv"], "little_big_query_test", writeDisposition="WRITE_TRUNCATE", max_jobs=2)
+        >>> len(jobs)
+        2
+        >>> BQ.query("select count(*) from [little_big_query_test.my_bulk_table]")
+        Waiting for job to finish...
+        Job complete.
+           f0_
+        0   20
+        >>> BQ.dropTable("my_bulk_table")
+        """
+        if not datasetId:
+            if not self.dataset:
+                raise LittleBigQueryException("No datasetId specified.")
+            else:
+                datasetId = self.dataset
+        if isinstance(sources, (type(""), type(u""))):
+            sources = [sources]
+        remote = []
+        local = []
+        for source in sources:
+            if source.startswith("gs://"):
+                if "*" in source:
+                    remote.extend(self.export_store.sizes(source))
+                else:
+                    remote.append((source, 0))
+            elif os.path.isdir(source):
+                local.extend(os.path.join(source, f) for f in sorted(os.listdir(source))
+                    if not f.startswith(".") and os.path.isfile(os.path.join(source, f)))
+            elif "*" in source or "?" in source:
+                local.extend(sorted(glob.glob(source)))
+            else:
+                local.append(source)
+        if not remote and not local:
+            raise LittleBigQueryException("No files to load.")
+
+        groups = self._group_files(remote, max_files_per_job, max_bytes_per_job)
+        local_groups = self._group_files([(f, os.path.getsize(f)) for f in local],
+            max_files_per_job if format in _CONCATENABLE else 1, max_bytes_per_job,
+            min_groups=max_jobs)
+        staging = None
+        target = tableName
+        if writeDisposition != "WRITE_APPEND" and len(groups) + len(local_groups) > 1:
+            staging = "%s_load_%s" % (tableName, uuid.uuid4().hex[:12])
+            target = staging
+        disposition = "WRITE_APPEND" if staging else writeDisposition
+
+        def load(group, is_local):
+            if is_local:
+                job = self._submit_local_load(target, schema, group, format, datasetId,
+                    disposition, skipLeadingRows)
+            else:
+                job = self._submit_load(target, schema, group, format, datasetId,
+                    disposition, skipLeadingRows)
+            return job.result(silent=True)
+
+        work = [(g, False) for g in groups] + [(g, True) for g in local_groups]
+        with self.instrumentation.span("bulk_load", table=tableName, jobs=len(work),
+            files=len(remote) + len(local)):
+            pool = ThreadPool(max(1, min(max_jobs, len(work))))
+            try:
+                results = pool.map(lambda w: load(*w), work)
+                if staging:
+                    self.submit_copyTable(staging, tableName, datasetId,
+                        writeDisposition=writeDisposition).result(silent=True)
+            finally:
+                pool.close()
+                pool.join()
+                if staging:
+                    try:
+                        self.dropTable(staging, datasetId)
+                    except HttpError:
+                        pass
+        return results
+
+    def _group_files(self, files, max_files, max_bytes, min_groups=1):
+        """
+        Splits (name, bytes) pairs, in order, into lists of names with at
+        most max_files names and max_bytes bytes each (a bigger file gets
+        a list of its own), and into at least min_groups lists if there
+        are as many files.
+        >>> BQ._group_files([("a", 5), ("b", 5), ("c", 5), ("d", 1)], 10, 10)
+        [['a', 'b'], ['c', 'd']]
+        >>> BQ._group_files([("a", 5), ("b", 5), ("c", 5), ("d", 1)], 10, 100, min_groups=3)
+        [['a'], ['b'], ['c', 'd']]
+        """
+        total = sum(size for _, size in files)
+        groups = max(min(min_groups, len(files)), -(-total // max_bytes) if max_bytes else 1)
+        # aim for groups of similar size, within the limits
+        target = max(1, -(-total // groups)) if groups else 1
+        result = []
+        group = []
+        group_bytes = 0
+        for name, size in files:
+            if group and (len(group) >= max_files or group_bytes + size > max_bytes
+                or group_bytes + size / 2.0 > target):
+                result.append(group)
+                group = []
+                group_bytes = 0
+            group.append(name)
+            group_bytes += size
+        if group:
+            result.append(group)
+        return result
+
+    def _submit_local_load(self, tableName, schema, paths, format, datasetId,
+        writeDisposition, skipLeadingRows=0):
+        """Uploads local files as one load job: CSV and JSON files are
+        concatenated into one gzipped file first, other formats are
+        uploaded one at a time."""
+        if len(paths) == 1 and format not in _CONCATENABLE:
+            request = self._load_request(tableName, schema, format, datasetId,
+                writeDisposition, skipLeadingRows=skipLeadingRows)
+            return self._write_job(self._upload_job(request, paths[0]), tableName, datasetId)
+        fd, upload_path = tempfile.mkstemp(suffix=".gz")
+        os.close(fd)
+        try:
+            with gzip.open(upload_path, "wb", GZIP_LEVEL) as out:
+                for path in paths:
+                    opener = gzip.open if path.endswith(".gz") else open
+                    with opener(path, "rb") as f:
+                        for _ in range(skipLeadingRows):
+                            f.readline()
+                        last = b""
+                        for block in iter(lambda: f.read(UPLOAD_CHUNKSIZE), b""):
+                            out.write(block)
+                            last = block
+                        # a file without a final newline must not run into the next
+                        if last and not last.endswith(b"\n"):
+                            out.write(b"\n")
+            request = self._load_request(tableName, schema, format, datasetId,
+                writeDisposition)
+            this_job = self._upload_job(request, upload_path)
+        finally:
+            os.remove(upload_path)
+        return self._write_job(this_job, tableName, datasetId)
         
     #createTableFromLocalCSV
-    def appendTableFromLocalCSV(self, tableName, schema, data_path, datasetId=None):
-        self.createTableFromLocalCSV(tableName, schema, data_path, datasetId)
+    def appendTableFromLocalCSV(self, tableName, schema, data_path, datasetId=None,
+        chunksize=UPLOAD_CHUNKSIZE, compress=False, progress=None):
+        self.createTableFromLocalCSV(tableName, schema, data_path, datasetId,
+            chunksize, compress, progress)
         
-    def createTableFromLocalCSV(self, tableName, schema, data_path, datasetId=None):
+    def createTableFromLocalCSV(self, tableName, schema, data_path, datasetId=None,
+        chunksize=UPLOAD_CHUNKSIZE, compress=False, progress=None):
         """
+        Loads a local CSV file with a chunked, resumable upload.  A
+        failed chunk is retried from the last byte BigQuery confirmed.
+
+        Arguments:
+            chunksize: bytes sent per request (a multiple of 256KB)
+            compress: gzip the file before sending it (True, or a gzip level 1-9)
+            progress: called as progress(bytes_sent, total_bytes, bytes_per_second)
         >>> BQ.createTableFromLocalCSV("my_csv_table", [("id", "INTEGER"), ("email", "STRING"), ("amount", "FLOAT"), ("event_time", "TIMESTAMP")], "examples/MOCK_DATA.csv", "little_big_query_test")
         Waiting for job to finish...
         Job complete.
@@ -722,6 +2506,15 @@ class LittleBigQuery(object):
         0   10
         >>> BQ.dropTable("my_csv_table")
         """
+        self.submit_createTableFromLocalCSV(tableName, schema, data_path, datasetId,
+            chunksize, compress, progress).result()
+
+    def submit_createTableFromLocalCSV(self, tableName, schema, data_path, datasetId=None,
+        chunksize=UPLOAD_CHUNKSIZE, compress=False, progress=None):
+        """
+        Like createTableFromLocalCSV, but returns a Job as soon as the job is
+        inserted instead of waiting for it.
+        """
         if not datasetId:
             if not self.dataset:
                 raise LittleBigQueryException("No datasetId specified.")
@@ -739,16 +2532,76 @@ class LittleBigQuery(object):
                         'datasetId' : datasetId,
                         'tableId' : tableName
                     },
-                    'source_format' : "CSV"
+                    'sourceFormat' : "CSV"
                 }
             } 
         }
-        mediaBody = MediaFileUpload(data_path,mimetype='application/octet-stream')
+        upload_path = data_path
+        if compress:
+            upload_path = self._gzip_file(data_path,
+                GZIP_LEVEL if compress is True else compress)
+        try:
+            this_job = self._upload_job(request, upload_path, chunksize, progress)
+        finally:
+            if upload_path != data_path:
+                os.remove(upload_path)
+        return self._write_job(this_job, tableName, datasetId)
+
+    def _upload_job(self, request, upload_path, chunksize=UPLOAD_CHUNKSIZE, progress=None):
+        """Inserts a load job whose data is the local file upload_path and
+        returns the job resource once the upload is complete.
+        """
+        # the data isn't part of the configuration, so never hash it
+        request["jobReference"] = self._job_reference()
+        mediaBody = MediaFileUpload(upload_path, mimetype='application/octet-stream',
+            chunksize=chunksize, resumable=True)
         insert_job = self.bigquery_service.jobs().insert(projectId=self.project_id,
             body=request, media_body=mediaBody)
-        
-        this_job = insert_job.execute()
-        self._poll_job(this_job)
+        return self._resumable_upload(insert_job, progress)
+
+    def _gzip_file(self, data_path, compresslevel=GZIP_LEVEL):
+        """Compresses data_path block by block into a temporary file and
+        returns its path.  The caller removes it.
+        """
+        fd, gz_path = tempfile.mkstemp(suffix=".csv.gz")
+        os.close(fd)
+        with open(data_path, "rb") as src:
+            with gzip.open(gz_path, "wb", compresslevel) as dst:
+                shutil.copyfileobj(src, dst, UPLOAD_CHUNKSIZE)
+        return gz_path
+
+    def _resumable_upload(self, insert_job, progress=None, max_failures=10, http=None):
+        """Sends a resumable media request chunk by chunk and returns the
+        final response.  After a failed chunk the next call to
+        next_chunk resumes from the last offset the server confirmed.
+        """
+        total = insert_job.resumable.size()
+        start = time.time()
+        delays = self.backoff.delays()
+        failures = 0
+        response = None
+        while response is None:
+            try:
+                # retries happen here rather than inside next_chunk, which
+                # would resend an already-consumed file slice
+                status, response = insert_job.next_chunk(http=http)
+            except (HttpError, httplib2.HttpLib2Error, socket.error) as e:
+                if isinstance(e, HttpError) and e.resp.status < 500 \
+                    and e.resp.status not in (408, 429):
+                    raise
+                failures += 1
+                if failures > max_failures:
+                    raise
+                self.instrumentation.count("retries", operation="upload")
+                time.sleep(next(delays))
+                continue
+            failures = 0
+            delays = self.backoff.delays()
+            if progress:
+                sent = total if response is not None else status.resumable_progress
+                elapsed = max(time.time() - start, 1e-6)
+                progress(sent, total, sent / elapsed)
+        return response
         
     #createExternalTable
     #TODO later
@@ -790,6 +2643,7 @@ class LittleBigQuery(object):
         
         table_job = self.bigquery_service.tables().insert(projectId=self.project_id,
             datasetId=datasetId, body=request).execute()
+        self._invalidate(viewName, datasetId)
         
         
     
@@ -798,11 +2652,13 @@ class LittleBigQuery(object):
 
 if __name__ == "__main__":
     import doctest
+    from .spool import open_spool
     if len(sys.argv) < 3:
-        print "Test Usage: little_big_query.py <project_id> <dataset_id>"
+        print("Test Usage: python -m little_big_query.little_big_query <project_id> <dataset_id>")
     else:
         projectName = sys.argv[1]
         datasetId = sys.argv[2]
         BQ = LittleBigQuery(projectName)
         BQ.useDataset("little_big_query_test")
-        doctest.testmod(extraglobs={"BQ":BQ, "datasetId":datasetId})
\ No newline at end of file
+        doctest.testmod(extraglobs={"BQ":BQ, "datasetId":datasetId,
+            "open_spool":open_spool})
\ No newline at end of file
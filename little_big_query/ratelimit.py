@@ -0,0 +1,125 @@
+#! /usr/bin/env python
+#
+# A shared, quota-aware request rate limiter for LittleBigQuery
+#
+import json
+import random
+import threading
+import time
+
+# error reasons BigQuery answers with when a request was refused for
+# going too fast, rather than for being wrong
+THROTTLE_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded")
+
+def is_throttled(status, content):
+    """
+    True for a response that refused a request because of a rate limit
+    or quota: a 429, or a 403 whose reason says so.
+    >>> is_throttled(403, b'{"error": {"errors": [{"reason": "rateLimitExceeded"}]}}')
+    True
+    >>> is_throttled(403, b'{"error": {"errors": [{"reason": "accessDenied"}]}}')
+    False
+    """
+    if status == 429:
+        return True
+    if status != 403 or not content:
+        return False
+    try:
+        if not isinstance(content, str):
+            content = content.decode("utf-8")
+        errors = json.loads(content).get("error", {}).get("errors", [])
+    except (ValueError, AttributeError):
+        return False
+    return any(e.get("reason") in THROTTLE_REASONS for e in errors)
+
+def retry_after(resp):
+    """The seconds a Retry-After header asks to wait, or None."""
+    try:
+        return float(resp.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class RateLimiter(object):
+    """
+    A token bucket that every API request of one or more clients draws
+    from, and that slows down on its own when BigQuery pushes back.
+
+    Requests are let through at up to rate per second, with bursts of up
+    to burst.  When a request is throttled (see is_throttled), every
+    caller pauses, for min_pause seconds at first and twice as long
+    after each further throttle in a row (up to max_pause, or for what
+    Retry-After asks), and the rate is multiplied by decrease; every
+    request that goes through raises it again by increase times rate.
+    The rate thus settles just under the quota instead of repeatedly
+    overshooting it.  Throttles of requests sent before a pause began
+    don't count again.  Without a rate nothing is held back until
+    BigQuery throttles, and then only the pauses apply.
+
+    reserve() never blocks, it returns how long to wait, so the same
+    limiter serves threads and asyncio tasks alike.
+
+    Attributes:
+        rate: the most requests per second (None: as many as BigQuery takes)
+        burst: the most requests let through at once after an idle spell
+        current: the rate in force now
+    """
+
+    def __init__(self, rate=None, burst=None, decrease=0.5, increase=0.02,
+        min_rate=1.0, min_pause=0.5, max_pause=32.0):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate or 1.0)
+        self.decrease = decrease
+        self.increase = increase
+        self.min_rate = min_rate
+        self.min_pause = min_pause
+        self.max_pause = max_pause
+        self.current = rate
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._paused_until = 0.0
+        self._pause = min_pause
+
+    def reserve(self, tokens=1):
+        """Takes tokens and returns the seconds to wait before using them."""
+        with self._lock:
+            now = time.time()
+            wait = max(0.0, self._paused_until - now)
+            if self.current is None:
+                return wait
+            self._tokens = min(self.burst,
+                self._tokens + (now - self._updated) * self.current)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.current)
+            return wait
+
+    def acquire(self, tokens=1):
+        """Waits until tokens requests may be sent."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    def succeeded(self):
+        """Reports a request that went through."""
+        with self._lock:
+            self._pause = self.min_pause
+            if self.current is not None:
+                self.current = min(self.current + self.increase * self.rate, self.rate)
+
+    def throttled(self, retry_after=None):
+        """Reports a throttled request: pauses every caller and lowers
+        the rate."""
+        with self._lock:
+            now = time.time()
+            if now < self._paused_until:
+                # sent before the pause began: already accounted for
+                return
+            if self.current is not None:
+                self.current = max(self.min_rate, self.current * self.decrease)
+                self._tokens = min(self._tokens, 0.0)
+                self._updated = now
+            pause = retry_after or self._pause * (1 + random.uniform(0, 0.2))
+            self._paused_until = now + pause
+            self._pause = min(self._pause * 2, self.max_pause)
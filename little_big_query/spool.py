@@ -0,0 +1,98 @@
+#! /usr/bin/env python
+#
+# Spooling query results to on-disk columnar files for LittleBigQuery
+#
+import os
+import tempfile
+
+from .lazy import LazyModule
+
+pa = LazyModule("pyarrow")
+pq = LazyModule("pyarrow.parquet")
+
+# file formats SpoolWriter can write: Parquet is compact, Feather (the
+# Arrow IPC file format) can be memory-mapped without any decoding
+FORMATS = ("parquet", "feather")
+
+def arrow_schema(fields):
+    """The Arrow schema the decoded frame of a BigQuery result is written
+    with, so every chunk lands in the same column types even when one is
+    all NULL."""
+    types = {"INTEGER": pa.int64(), "FLOAT": pa.float64(), "BOOLEAN": pa.bool_(),
+        "TIMESTAMP": pa.timestamp("us", tz="UTC")}
+    return pa.schema([pa.field(f["name"], types.get(f["type"], pa.string()))
+        for f in fields])
+
+class SpoolWriter(object):
+    """
+    Appends data frames to a Parquet or Feather file one at a time, so a
+    result larger than memory can be written chunk by chunk.  Each frame
+    becomes one Parquet row group or one Arrow record batch.  The file is
+    written under a temporary name and only renamed to path by close(),
+    so a half written result is never mistaken for a whole one.
+
+    Attributes:
+        path: the file being written
+        format: "parquet" or "feather"
+        rows: the rows written so far
+    """
+
+    def __init__(self, path, fields, format="parquet", compression=None):
+        if format not in FORMATS:
+            raise ValueError("Unknown spool format: %s" % format)
+        self.path = path
+        self.format = format
+        self.rows = 0
+        self.schema = arrow_schema(fields)
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, self._tmp = tempfile.mkstemp(dir=directory, suffix=".partial")
+        os.close(fd)
+        if format == "parquet":
+            self._writer = pq.ParquetWriter(self._tmp, self.schema,
+                compression=compression or "snappy")
+        else:
+            # uncompressed unless asked, so reading it back is zero copy
+            options = pa.ipc.IpcWriteOptions(compression=compression)
+            self._writer = pa.ipc.new_file(self._tmp, self.schema, options=options)
+
+    def write(self, frame):
+        table = pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+        self._writer.write_table(table)
+        self.rows += len(frame)
+
+    def close(self):
+        self._writer.close()
+        os.rename(self._tmp, self.path)
+
+    def abort(self):
+        """Stops writing and deletes the partial file."""
+        try:
+            self._writer.close()
+        finally:
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def open_spool(path, columns=None):
+    """
+    Opens a file written by SpoolWriter (or LittleBigQuery.query_to_file)
+    memory-mapped and returns it as a pyarrow Table.  Only the columns
+    asked for are read.  Feather columns point straight into the mapped
+    file, so they are neither copied nor held in memory until touched;
+    Parquet columns are decompressed from the mapping.  Use
+    .to_pandas() for a data frame.
+    """
+    if path.endswith(".parquet"):
+        return pq.read_table(path, columns=columns, memory_map=True)
+    try:
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    except pa.ArrowInvalid:
+        return pq.read_table(path, columns=columns, memory_map=True)
+    return table.select(columns) if columns is not None else table
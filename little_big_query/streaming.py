@@ -0,0 +1,238 @@
+#! /usr/bin/env python
+#
+# Streaming inserts (tabledata.insertAll) for LittleBigQuery
+#
+from datetime import date, datetime
+from multiprocessing.pool import ThreadPool
+import json
+import sys
+import threading
+import time
+import uuid
+
+from googleapiclient.errors import HttpError
+import httplib2
+
+# insertAll accepts at most 10,000 rows and 10MB per request
+MAX_BATCH_ROWS = 10000
+MAX_BATCH_BYTES = 10 * 1024 * 1024
+
+# per-row error reasons that mean the row itself was fine
+_RETRYABLE_REASONS = set(["stopped", "backendError", "internalError", "timeout"])
+
+def _json_value(v):
+    """Makes pandas, numpy and datetime values JSON serializable."""
+    if v is None:
+        return None
+    # pandas Timestamps are datetimes, and NaT is the one that isn't equal to itself
+    if isinstance(v, (datetime, date)):
+        return v.isoformat() if v == v else None
+    # only look for numpy and pandas values if they have been imported
+    if "numpy" in sys.modules and isinstance(v, sys.modules["numpy"].generic):
+        v = v.item()
+    if isinstance(v, float) and v != v:
+        return None
+    if "pandas" in sys.modules and v is getattr(sys.modules["pandas"], "NA", None):
+        return None
+    return v
+
+class StreamWriter(object):
+    """
+    Buffers rows for one table and streams them in with
+    tabledata().insertAll.  A background thread sends a batch when it
+    reaches max_rows rows or max_bytes bytes, or when its oldest row is
+    max_age seconds old, with up to max_in_flight requests at a time.
+    Every row gets an insertId, so retried batches are de-duplicated by
+    BigQuery.  write() blocks once max_buffered rows are waiting.
+
+    Attributes:
+        errors: [(row, insertErrors)] for rows BigQuery rejected
+        rows_sent: the number of rows accepted so far
+
+    Use as a context manager, or call close() when done; errors from
+    requests that failed outright are raised from write(), flush() or
+    close().
+    """
+
+    def __init__(self, bq, tableName, datasetId, max_rows=500,
+        max_bytes=1024 * 1024, max_age=1.0, max_in_flight=4,
+        max_buffered=50000, max_retries=5, on_error=None):
+        self._bq = bq
+        self.tableName = tableName
+        self.datasetId = datasetId
+        self.max_rows = min(max_rows, MAX_BATCH_ROWS)
+        self.max_bytes = min(max_bytes, MAX_BATCH_BYTES)
+        self.max_age = max_age
+        self.max_buffered = max(max_buffered, self.max_rows)
+        self.max_retries = max_retries
+        self.on_error = on_error
+        self.errors = []
+        self.rows_sent = 0
+
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._oldest = None
+        self._in_flight = 0
+        self._closed = False
+        self._failure = None
+        self._cond = threading.Condition()
+        self._slots = threading.Semaphore(max_in_flight)
+        self._pool = ThreadPool(max_in_flight)
+        self._flusher = threading.Thread(target=self._run)
+        self._flusher.daemon = True
+        self._flusher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, row):
+        """Queues one row (a dict of column name to value)."""
+        self.write_rows([row])
+
+    def write_rows(self, rows):
+        """Queues rows, blocking while the buffer is full."""
+        entries = []
+        for row in rows:
+            clean = dict((k, _json_value(v)) for k, v in row.items())
+            entries.append(({"insertId": uuid.uuid4().hex, "json": clean},
+                len(json.dumps(clean))))
+        with self._cond:
+            for entry in entries:
+                while len(self._buffer) >= self.max_buffered and not self._closed:
+                    self._raise_failure()
+                    self._cond.notify_all()
+                    self._cond.wait(0.1)
+                if self._closed:
+                    raise ValueError("StreamWriter is closed")
+                if not self._buffer:
+                    self._oldest = time.time()
+                self._buffer.append(entry)
+                self._buffer_bytes += entry[1]
+            self._cond.notify_all()
+
+    def flush(self):
+        """Blocks until every queued row has been sent."""
+        with self._cond:
+            self._oldest = 0
+            self._cond.notify_all()
+            while self._buffer or self._in_flight:
+                self._raise_failure()
+                self._cond.wait(0.1)
+        self._raise_failure()
+
+    def close(self):
+        """Flushes and stops the background thread."""
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            self._flusher.join()
+            self._pool.close()
+            self._pool.join()
+
+    def _raise_failure(self):
+        if self._failure is not None:
+            failure, self._failure = self._failure, None
+            raise failure
+
+    def _batch_ready(self):
+        if not self._buffer:
+            return False
+        return (len(self._buffer) >= self.max_rows
+            or self._buffer_bytes >= self.max_bytes
+            or time.time() - self._oldest >= self.max_age)
+
+    def _take_batch(self):
+        batch, size = [], 0
+        while self._buffer and len(batch) < self.max_rows:
+            entry = self._buffer[0]
+            if batch and size + entry[1] > self.max_bytes:
+                break
+            batch.append(self._buffer.pop(0)[0])
+            size += entry[1]
+        self._buffer_bytes -= size
+        if self._buffer and self._oldest:
+            self._oldest = time.time()
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._batch_ready() and not self._closed:
+                    timeout = self.max_age
+                    if self._buffer and self._oldest:
+                        timeout = max(0, self._oldest + self.max_age - time.time())
+                    self._cond.wait(timeout)
+                if self._closed and not self._buffer:
+                    return
+                batch = self._take_batch()
+                self._in_flight += 1
+                self._cond.notify_all()
+            # wait for a free request slot outside the lock, so writers
+            # keep filling the buffer until it pushes back
+            self._slots.acquire()
+            self._pool.apply_async(self._send, (batch,))
+
+    def _send(self, batch):
+        try:
+            self._insert(batch)
+        except Exception as e:
+            with self._cond:
+                self._failure = e
+        finally:
+            self._slots.release()
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _insert(self, batch):
+        tabledata = self._bq.bigquery_service.tabledata()
+        delays = self._bq.backoff.delays()
+        attempt = 0
+        while batch:
+            try:
+                response = tabledata.insertAll(projectId=self._bq.project_id,
+                    datasetId=self.datasetId, tableId=self.tableName,
+                    body={"rows": batch}).execute()
+            except (HttpError, httplib2.HttpLib2Error, IOError) as e:
+                if isinstance(e, HttpError) and e.resp.status < 500 \
+                    and e.resp.status not in (408, 429):
+                    raise
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                self._bq.instrumentation.count("retries", operation="insertAll")
+                time.sleep(next(delays))
+                continue
+
+            retry = []
+            rejected = []
+            for failure in response.get("insertErrors", []):
+                row = batch[failure["index"]]
+                reasons = set(e.get("reason") for e in failure.get("errors", []))
+                if reasons <= _RETRYABLE_REASONS and attempt < self.max_retries:
+                    retry.append(row)
+                else:
+                    rejected.append((row["json"], failure.get("errors", [])))
+            with self._cond:
+                self.rows_sent += len(batch) - len(retry) - len(rejected)
+                self.errors.extend(rejected)
+            if rejected and self.on_error:
+                self.on_error(rejected)
+            if len(retry) + len(rejected) < len(batch):
+                self._bq._invalidate(self.tableName, self.datasetId)
+            self._bq.instrumentation.count("rows_streamed",
+                len(batch) - len(retry) - len(rejected))
+            if retry:
+                attempt += 1
+                self._bq.instrumentation.count("retries", len(retry),
+                    operation="insertAll")
+                time.sleep(next(delays))
+            batch = retry
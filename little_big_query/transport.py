@@ -0,0 +1,144 @@
+#! /usr/bin/env python
+#
+# A thread-safe pool of authorized HTTP transports for LittleBigQuery
+#
+from contextlib import contextmanager
+import threading
+
+import httplib2
+
+from .instrumentation import NullInstrumentation
+from .ratelimit import RateLimiter, is_throttled, retry_after
+
+def operation(uri):
+    """
+    Names the API collection or method a request URI addresses.
+    >>> operation("https://bigquery.googleapis.com/bigquery/v2/projects/p/datasets/d/tables/t?alt=json")
+    'tables'
+    >>> operation("https://bigquery.googleapis.com/upload/bigquery/v2/projects/p/jobs?uploadType=resumable")
+    'jobs'
+    """
+    path = uri.split("?")[0].rstrip("/")
+    if "/v2" not in path:
+        return path.split("/")[-1]
+    rest = path.split("/v2", 1)[1].strip("/")
+    if not rest:
+        # only batch requests go to the bare API root
+        return "batch"
+    parts = rest.split("/")
+    return parts[-1] if len(parts) % 2 else parts[-2]
+
+def new_http():
+    http = httplib2.Http()
+    # resumable uploads answer 308 for "resume incomplete", which
+    # newer httplib2 versions would follow as a redirect
+    if hasattr(http, "redirect_codes"):
+        http.redirect_codes = set(http.redirect_codes) - set([308])
+    return http
+
+class HttpPool(object):
+    """
+    Stands in for an httplib2.Http that many threads can share.  Each
+    request borrows one of up to size authorized Http objects for its
+    duration and hands it back afterwards, so connections are kept alive
+    between requests while no two threads ever use the same one.  When
+    every transport is busy, request() waits for one to come back.
+
+    All transports share one set of credentials, which are refreshed
+    once, by whichever thread first finds the token expired, instead of
+    by every thread that runs into a 401.
+
+    Every request first waits for limiter, so size caps the requests in
+    flight and limiter their rate.  Requests refused by a rate limit or
+    quota are sent again, up to max_throttled times, once limiter has
+    backed off; other errors are left to the caller.
+
+    Every request is timed as an "http" span of instrumentation.
+
+    Attributes:
+        credentials: the credentials every transport is authorized with
+        size: the most transports the pool creates
+        limiter: the RateLimiter requests wait for
+        max_throttled: the most times a throttled request is resent
+        instrumentation: where request timings and byte counts go
+    """
+
+    def __init__(self, credentials, size=16, factory=new_http,
+        instrumentation=None, limiter=None, max_throttled=8):
+        self.credentials = credentials
+        self.size = size
+        self.limiter = limiter or RateLimiter()
+        self.max_throttled = max_throttled
+        self.instrumentation = instrumentation or NullInstrumentation()
+        self._factory = factory
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._refresh_lock = threading.Lock()
+
+    def request(self, uri, method="GET", *args, **kwargs):
+        name = operation(uri)
+        throttled = 0
+        while True:
+            self.limiter.acquire()
+            with self.instrumentation.span("http", method=method,
+                operation=name) as span:
+                with self.lease() as http:
+                    resp, content = http.request(uri, method, *args, **kwargs)
+                span.tags["status"] = resp.status
+                span.tags["bytes"] = len(content or b"")
+            self.instrumentation.count("http.bytes_received", len(content or b""))
+            if not is_throttled(resp.status, content):
+                self.limiter.succeeded()
+                return resp, content
+            self.limiter.throttled(retry_after(resp))
+            self.instrumentation.count("http.throttled", operation=name)
+            throttled += 1
+            if throttled > self.max_throttled:
+                return resp, content
+
+    @contextmanager
+    def lease(self):
+        """Borrows a transport for the body of a with block."""
+        http = self._acquire()
+        try:
+            self._refresh_if_expired()
+            yield http
+        finally:
+            with self._cond:
+                self._idle.append(http)
+                self._cond.notify()
+
+    def close(self):
+        """Closes the connections of every idle transport."""
+        with self._cond:
+            for http in self._idle:
+                for conn in list(getattr(http, "connections", {}).values()):
+                    conn.close()
+
+    def _acquire(self):
+        with self._cond:
+            while not self._idle and self._created >= self.size:
+                self._cond.wait()
+            if self._idle:
+                # the most recently used transport is the likeliest to
+                # still have an open connection
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return self.credentials.authorize(self._factory())
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def _refresh_if_expired(self):
+        credentials = self.credentials
+        if not hasattr(credentials, "access_token_expired"):
+            return
+        if credentials.access_token is not None and not credentials.access_token_expired:
+            return
+        with self._refresh_lock:
+            if credentials.access_token is None or credentials.access_token_expired:
+                credentials.refresh(self._factory())
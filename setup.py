@@ -21,5 +21,6 @@ setup(
     url='https://github.com/dwmclary/little_big_query',
     packages=find_packages(exclude=['contrib', 'docs', 'tests']),
     install_requires=['pandas', 'google-api-python-client >= 1.5.1'],
+    extras_require={'parquet': ['pyarrow'], 'async': ['aiohttp'], 'avro': ['fastavro']},
     dependency_links = ["https://github.com/google/google-api-python-client.git"]
     )
\ No newline at end of file